@@ -0,0 +1,92 @@
+import time
+from argparse import ArgumentParser
+import numpy as np
+from benchmarks.bench_batch_size import load_frames
+from src.parallel import build_stage
+from src.utils.backends import load_model, backend_options, BACKENDS, PRECISIONS
+from src.utils.img_utils import box_iou
+from src.utils.io import load_config
+
+# detections of the exported model must match the .pt baseline this closely
+DEFAULT_IOU_THRESHOLD = 0.9
+DEFAULT_MIN_MATCH = 0.95
+STAGE_MODELS = {"ball": "ball_model_path", "player": "player_model_path", "action": "action_model_path"}
+
+
+def detect(model, frames, options):
+    # raw detections per frame at the stage's predict options, so tracker state does not hide differences;
+    # returns the detections and fps
+    detections = []
+    start = time.perf_counter()
+    for _, frame in frames:
+        result = model.predict(source=frame, verbose=False, **options)[0]
+        detections.append((result.boxes.xyxy.cpu().numpy(), result.boxes.cls.cpu().numpy(),
+                           result.boxes.conf.cpu().numpy()))
+    return detections, len(frames) / (time.perf_counter() - start)
+
+
+def compare(baseline, candidate, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    # share of baseline boxes found by the candidate (recall) and of candidate boxes found in the baseline
+    # (precision), matching boxes of the same class one to one by IoU, plus the mean confidence difference
+    num_baseline = num_candidate = num_matched = 0
+    conf_diffs = []
+    for (base_boxes, base_cls, base_conf), (cand_boxes, cand_cls, cand_conf) in zip(baseline, candidate):
+        num_baseline += len(base_boxes)
+        num_candidate += len(cand_boxes)
+        if len(base_boxes) == 0 or len(cand_boxes) == 0:
+            continue
+        ious = box_iou(base_boxes, cand_boxes) * (base_cls[:, None] == cand_cls[None, :])
+        for i in np.argsort(-base_conf):
+            j = int(np.argmax(ious[i]))
+            if ious[i, j] >= iou_threshold:
+                ious[:, j] = -1  # each candidate box matches once
+                num_matched += 1
+                conf_diffs.append(abs(float(base_conf[i]) - float(cand_conf[j])))
+    return {"recall": num_matched / num_baseline if num_baseline else 1.0,
+            "precision": num_matched / num_candidate if num_candidate else 1.0,
+            "conf_diff": float(np.mean(conf_diffs)) if conf_diffs else 0.0}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Compare detections of an exported backend against the .pt baseline")
+    parser.add_argument('-i', '--video_path', type=str, default='inputs/input_video.mp4', help="Path to input video")
+    parser.add_argument('-c', '--config', type=str, default="config/config.yaml", help="Path to config file")
+    parser.add_argument('-n', '--num_frames', type=int, default=64, help="Number of frames to compare")
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default=None,
+                        help="Backend to test for every stage, instead of model_backends from the config")
+    parser.add_argument('--precision', type=str, choices=PRECISIONS, default=None, help="Precision of --backend")
+    parser.add_argument('--stages', type=str, nargs='+', choices=list(STAGE_MODELS), default=list(STAGE_MODELS))
+    parser.add_argument('--iou', type=float, default=DEFAULT_IOU_THRESHOLD, help="IoU for two boxes to match")
+    parser.add_argument('--min_match', type=float, default=DEFAULT_MIN_MATCH,
+                        help="Fail when recall or precision of any stage is below this")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    config["video_path"] = args.video_path
+    frames = load_frames(args.video_path, args.num_frames)
+    frame_height, frame_width = frames[0][1].shape[:2]
+
+    # the .pt baseline is the model of a torch stage, built like the pipeline builds it
+    torch_config = dict(config, model_backends={})
+
+    failed = False
+    print(f"{'stage':<8} {'backend':<22} {'recall':>7} {'precision':>10} {'conf diff':>10} {'base fps':>9} {'fps':>8}")
+    for stage in args.stages:
+        options = backend_options(config, stage)
+        if args.backend:
+            options.update(backend=args.backend, precision=args.precision or "fp32")
+        # the input size and confidence the pipeline runs the stage at
+        tracker = build_stage(stage, torch_config)
+        tracker.set_frame_size(frame_width, frame_height)
+        predict_options = tracker.predict_options()
+
+        baseline, base_fps = detect(tracker.model.load(), frames, predict_options)
+        candidate, fps = detect(load_model(config[STAGE_MODELS[stage]], **options), frames, predict_options)
+        parity = compare(baseline, candidate, args.iou)
+
+        failed |= parity["recall"] < args.min_match or parity["precision"] < args.min_match
+        backend = f"{options['backend']} ({options['precision']})"
+        print(f"{stage:<8} {backend:<22} {parity['recall']:>7.3f} {parity['precision']:>10.3f} "
+              f"{parity['conf_diff']:>10.4f} {base_fps:>9.1f} {fps:>8.1f}")
+
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,71 @@
+import time
+from argparse import ArgumentParser
+from src.trackers.ball_tracker import BallTracker
+from src.trackers.player_tracker import PlayerTracker
+from src.predictors.action_predictor import ActionPredictor
+from src.utils.io import load_config
+from src.utils.video import FrameReader, batched
+
+# batch sizes reported by default
+DEFAULT_BATCH_SIZES = (1, 8, 32)
+
+
+def load_frames(video_path, max_frames):
+    # decode frames up front so only inference is measured
+    frames = []
+    with FrameReader(video_path) as reader:
+        for frame_id, frame in reader:
+            if frame_id >= max_frames:
+                break
+            frames.append((frame_id, frame))
+    return frames
+
+
+def build_stages(config, batch_size):
+    # fresh models per run so tracker state does not leak between batch sizes
+    ball_tracker = BallTracker(config["ball_model_path"], config["video_path"], config["mask_path"],
+                               batch_size=batch_size)
+    player_tracker = PlayerTracker(config["player_model_path"], config["video_path"], config["mask_path"],
+                                   batch_size=batch_size)
+    action_predictor = ActionPredictor(config["action_model_path"], config["video_path"],
+                                       action_classes=config["action_classes"], mask_path=config["mask_path"],
+                                       batch_size=batch_size)
+    return {"ball": ball_tracker, "player": player_tracker, "action": action_predictor}
+
+
+def benchmark(config, frames, batch_size, warmup=1):
+    stages = build_stages(config, batch_size)
+    height, width = frames[0][1].shape[:2]
+    for stage in stages.values():
+        stage.set_frame_size(width, height)
+
+    fps = {}
+    for name, stage in stages.items():
+        # warm up model initialisation outside of the timed loop
+        for frame_ids, batch in batched(frames[:batch_size * warmup], batch_size):
+            stage.process_batch(frame_ids, batch)
+
+        start = time.perf_counter()
+        for frame_ids, batch in batched(frames, batch_size):
+            stage.process_batch(frame_ids, batch)
+        fps[name] = len(frames) / (time.perf_counter() - start)
+    return fps
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Frames per second of each model for several batch sizes")
+    parser.add_argument('-i', '--video_path', type=str, default='inputs/input_video.mp4', help="Path to input video")
+    parser.add_argument('-c', '--config', type=str, default="config/config.yaml", help="Path to config file")
+    parser.add_argument('-n', '--num_frames', type=int, default=256, help="Number of frames to benchmark")
+    parser.add_argument('-b', '--batch_sizes', type=int, nargs='+', default=list(DEFAULT_BATCH_SIZES),
+                        help="Batch sizes to benchmark")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    config["video_path"] = args.video_path
+    frames = load_frames(args.video_path, args.num_frames)
+
+    print(f"{'batch':>6} {'ball fps':>10} {'player fps':>11} {'action fps':>11}")
+    for batch_size in args.batch_sizes:
+        fps = benchmark(config, frames, batch_size)
+        print(f"{batch_size:>6} {fps['ball']:>10.1f} {fps['player']:>11.1f} {fps['action']:>11.1f}")
@@ -0,0 +1,210 @@
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import nullcontext
+from benchmarks.stub_models import STUB_MODEL_PATHS, patch_models
+from benchmarks.synthetic import write_court_video, write_court_mask
+from src.pipeline import VolleyballPipeline
+from src.utils.img_utils import load_mask, load_court_mask
+from src.utils.io import load_config, save_json_data
+from src.utils.profiler import Profiler
+
+# constants for easy configuration
+DEFAULT_LENGTHS = (50, 150, 450)  # synthetic video lengths in frames, to show how every step scales
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+DEFAULT_TOLERANCE = 0.25  # allowed slowdown (time) and growth (peak memory) against the baseline
+MIN_SECONDS = 0.05  # differences below these are noise, never regressions
+MIN_MEMORY_MB = 1.0
+MISSING_BASELINE_EXIT_CODE = 2  # so a CI job without a baseline fails visibly instead of passing unchecked
+INCOMPARABLE_BASELINE_EXIT_CODE = 3  # baseline recorded on another machine or with other settings
+STEPS = ("load_mask", "ball", "player", "action", "save_json_data", "visualize")
+
+
+def bench_config(config, video_path, mask_path, stub_models):
+    # the pipeline config for one synthetic video: plain sequential stages, no caches or saved results
+    config = dict(config, video_path=video_path, mask_path=mask_path, cache_dir="", record_output=False,
+                  num_workers=0, single_pass=False, heatmaps=False, action_output="frames", output_format="json")
+    if stub_models:
+        config["model_backends"] = {}
+        config.update({f"{stage}_model_path": path for stage, path in STUB_MODEL_PATHS.items()})
+    return config
+
+
+def run_step(pipeline, step, data, output_root, frame_size):
+    # one benchmarked step; stage steps add their results to data for the later steps
+    config = pipeline.config
+    if step == "load_mask":
+        width, height = frame_size
+        load_mask(config["mask_path"], width, height)
+        load_court_mask(config["mask_path"], width, height)
+    elif step == "ball":
+        data["ball"] = pipeline.ball_tracker.process_video(read_from_json=False)
+    elif step == "player":
+        data["player"] = pipeline.player_tracker.process_video(read_from_json=False)
+    elif step == "action":
+        data["action"] = pipeline.action_predictor.process_video(read_from_json=False)
+    elif step == "save_json_data":
+        for kind in ("ball", "player", "action"):
+            save_json_data(data[kind], os.path.join(output_root, f"bench_{kind}.json"))
+    elif step == "visualize":
+        pipeline.visualize(data["ball"], data["player"], data["action"], save=True)
+
+
+def new_pipeline(config, output_root, frame_size):
+    pipeline = VolleyballPipeline(dict(config))
+    pipeline.set_video(config["video_path"], output_root)
+    # the stages load court masks for 1920x1080 frames; match the synthetic frame size so players are kept
+    court_mask = load_court_mask(config["mask_path"], *frame_size)
+    pipeline.player_tracker.court_mask = pipeline.action_predictor.court_mask = court_mask
+    # models load on first use, outside the timed steps
+    for stage in (pipeline.ball_tracker, pipeline.player_tracker, pipeline.action_predictor):
+        stage.model.load()
+    return pipeline
+
+
+def measure(config, output_root, frame_size, repeat, track_memory):
+    # best time over repeat runs of every step, then one run under tracemalloc for each step's peak memory;
+    # every run starts from a fresh pipeline so tracker state never carries over
+    seconds = {step: float("inf") for step in STEPS}
+    profile = None
+    for _ in range(repeat):
+        pipeline, data = new_pipeline(config, output_root, frame_size), {}
+        profiler = Profiler()
+        pipeline.set_profiler(profiler)
+        for step in STEPS:
+            start = time.perf_counter()
+            run_step(pipeline, step, data, output_root, frame_size)
+            seconds[step] = min(seconds[step], time.perf_counter() - start)
+        profile = profiler.report()
+
+    peak_mb = {}
+    if track_memory:
+        pipeline, data = new_pipeline(config, output_root, frame_size), {}
+        for step in STEPS:
+            tracemalloc.start()
+            run_step(pipeline, step, data, output_root, frame_size)
+            peak_mb[step] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+    return seconds, peak_mb, profile
+
+
+def run_suite(config, lengths, width, height, work_dir, repeat=1, track_memory=True, stub_models=True):
+    """Benchmark every step on synthetic videos of each length; returns a JSON-serializable results dict."""
+    runs = {}
+    models = patch_models(len(config["action_classes"])) if stub_models else nullcontext()
+    mask_path = write_court_mask(os.path.join(work_dir, f"mask_{width}x{height}.png"), width, height)
+    with models:
+        for num_frames in lengths:
+            video_path = os.path.join(work_dir, f"court_{width}x{height}_{num_frames}.mp4")
+            if not os.path.isfile(video_path):
+                write_court_video(video_path, num_frames, width, height)
+            output_root = os.path.join(work_dir, f"outputs_{num_frames}")
+            run_config = bench_config(config, video_path, mask_path, stub_models)
+            seconds, peak_mb, profile = measure(run_config, output_root, (width, height), repeat, track_memory)
+
+            runs[str(num_frames)] = {
+                step: {"seconds": round(seconds[step], 4),
+                       "fps": round(num_frames / seconds[step], 2) if step != "load_mask" and seconds[step] > 0 else None,
+                       "peak_mb": round(peak_mb[step], 2) if step in peak_mb else None}
+                for step in STEPS}
+            runs[str(num_frames)]["profile"] = profile["steps"]
+    return {"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpu_count": os.cpu_count()},
+            "settings": {"width": width, "height": height, "lengths": list(lengths), "stub_models": stub_models},
+            "repeat": repeat,
+            "runs": runs}
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE, memory_tolerance=DEFAULT_TOLERANCE):
+    # steps slower or using more peak memory than the baseline beyond the tolerances, as readable messages;
+    # absolute timings only compare on the machine and settings the baseline was recorded with
+    for key in ("machine", "settings"):
+        if baseline.get(key) != results[key]:
+            raise ValueError(f"baseline {key} {baseline.get(key)} differs from this run {results[key]}, "
+                             f"re-record the baseline here with --save_baseline")
+    regressions = []
+    for length, steps in results["runs"].items():
+        for step in STEPS:
+            current, reference = steps[step], baseline["runs"].get(length, {}).get(step)
+            if reference is None:
+                continue
+            if current["seconds"] > reference["seconds"] * (1 + tolerance) \
+                    and current["seconds"] - reference["seconds"] > MIN_SECONDS:
+                regressions.append(f"{step} @ {length} frames: {current['seconds']:.3f} s, "
+                                   f"baseline {reference['seconds']:.3f} s")
+            if current["peak_mb"] is not None and reference["peak_mb"] is not None \
+                    and current["peak_mb"] > reference["peak_mb"] * (1 + memory_tolerance) \
+                    and current["peak_mb"] - reference["peak_mb"] > MIN_MEMORY_MB:
+                regressions.append(f"{step} @ {length} frames: peak {current['peak_mb']:.1f} MB, "
+                                   f"baseline {reference['peak_mb']:.1f} MB")
+    return regressions
+
+
+def summary_table(results):
+    # frames per second of every step at every length (load_mask in ms), then peak memory
+    lengths = list(results["runs"])
+    lines = [f"{'step':<16}" + "".join(f"{length + ' fr':>12}" for length in lengths) + f"{'peak MB':>10}"]
+    for step in STEPS:
+        row = f"{step:<16}"
+        for length in lengths:
+            entry = results["runs"][length][step]
+            row += f"{entry['seconds'] * 1000:>9.1f} ms" if entry["fps"] is None else f"{entry['fps']:>8.1f} fps"
+        peak = results["runs"][lengths[-1]][step]["peak_mb"]
+        lines.append(row + (f"{peak:>10.1f}" if peak is not None else f"{'-':>10}"))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="End-to-end benchmark of every pipeline step on synthetic videos")
+    parser.add_argument('-c', '--config', type=str, default="config/config.yaml", help="Path to config file")
+    parser.add_argument('-l', '--lengths', type=int, nargs='+', default=list(DEFAULT_LENGTHS),
+                        help="Synthetic video lengths in frames")
+    parser.add_argument('--width', type=int, default=1280, help="Synthetic video width")
+    parser.add_argument('--height', type=int, default=720, help="Synthetic video height")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Runs per step, the fastest is kept")
+    parser.add_argument('--work_dir', type=str, default=None,
+                        help="Directory for synthetic videos and outputs, kept between runs (default: temporary)")
+    parser.add_argument('--real_models', action='store_true', help="Run the configured models instead of the stubs")
+    parser.add_argument('--no_memory', action='store_true', help="Skip the tracemalloc peak memory run")
+    parser.add_argument('-b', '--baseline', type=str, default=DEFAULT_BASELINE, help="Baseline results file")
+    parser.add_argument('--save_baseline', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('-o', '--output', type=str, default=None, help="Also write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown, e.g. 0.25")
+    parser.add_argument('--memory_tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed peak memory growth, e.g. 0.25")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    with (nullcontext(args.work_dir) if args.work_dir else tempfile.TemporaryDirectory()) as work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+        results = run_suite(config, args.lengths, args.width, args.height, work_dir, args.repeat,
+                            not args.no_memory, not args.real_models)
+    print(summary_table(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = find_regressions(results, baseline, args.tolerance, args.memory_tolerance)
+        except ValueError as e:
+            print(f"Cannot compare against {args.baseline}: {e}")
+            raise SystemExit(INCOMPARABLE_BASELINE_EXIT_CODE)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against {args.baseline}")
+    else:
+        print(f"No baseline at {args.baseline}, run with --save_baseline to create one")
+        raise SystemExit(MISSING_BASELINE_EXIT_CODE)
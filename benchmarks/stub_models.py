@@ -0,0 +1,116 @@
+import os
+from types import SimpleNamespace
+from functools import partial
+from unittest import mock
+import cv2
+import numpy as np
+from benchmarks.synthetic import BALL_COLOR, PLAYER_COLOR
+
+# stand-ins for the YOLO checkpoints, so the benchmarks run offline on CPU without model files
+STUB_MODEL_PATHS = {"ball": "stub/ball.pt", "player": "stub/player.pt", "action": "stub/action.pt"}
+COLOR_TOLERANCE = 60  # max per-channel distance to a synthetic colour
+MIN_AREA = 20  # pixels of the smallest blob reported as a detection
+MAX_TRACK_DISTANCE = 0.05  # max move of a tracked blob between frames, as a share of the image width
+ACTION_BANDS = 8  # action class of a player blob from the horizontal band it stands in
+
+
+class StubArray(np.ndarray):
+    # numpy array with the torch tensor methods the stages call on results
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.view(np.ndarray)
+
+
+class StubBoxes:
+    def __init__(self, xyxy, conf, cls, track_ids=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4).view(StubArray)
+        self.conf = np.asarray(conf, dtype=np.float32).view(StubArray)
+        self.cls = np.asarray(cls, dtype=np.float32).view(StubArray)
+        self.id = None if track_ids is None else np.asarray(track_ids, dtype=np.float32).view(StubArray)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class StubResult:
+    def __init__(self, boxes, speed):
+        self.boxes = boxes
+        self.speed = speed
+
+
+class StubTracker:
+    # greedy nearest-center matching, a cheap stand-in for ByteTrack with the same reset() hook
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.centers = {}  # track_id -> last center
+        self.next_id = 1
+
+    def update(self, centers, max_distance):
+        track_ids, unmatched = [], dict(self.centers)
+        for center in centers:
+            best = min(unmatched, key=lambda track_id: np.hypot(*(unmatched[track_id] - center)), default=None)
+            if best is None or np.hypot(*(unmatched[best] - center)) > max_distance:
+                best, self.next_id = self.next_id, self.next_id + 1
+            else:
+                del unmatched[best]
+            track_ids.append(best)
+        self.centers = {track_id: center for track_id, center in zip(track_ids, centers)}
+        return track_ids
+
+
+class StubYOLO:
+    # finds the synthetic ball or player blobs by colour; the model kind comes from the checkpoint name,
+    # so the pipeline runs unchanged with STUB_MODEL_PATHS and YOLO patched to this class
+    def __init__(self, model_path, task=None, num_action_classes=5):
+        self.kind = os.path.splitext(os.path.basename(model_path))[0]
+        self.num_action_classes = num_action_classes
+        self.predictor = None  # created by the first track() call, like ultralytics
+
+    def detect(self, image):
+        color = np.array(BALL_COLOR if self.kind == "ball" else PLAYER_COLOR)
+        mask = cv2.inRange(image, np.clip(color - COLOR_TOLERANCE, 0, 255), np.clip(color + COLOR_TOLERANCE, 0, 255))
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        stats = stats[1:][stats[1:, cv2.CC_STAT_AREA] >= MIN_AREA]
+        boxes = np.empty((len(stats), 4), dtype=np.float32)
+        boxes[:, :2] = stats[:, [cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP]]
+        boxes[:, 2:] = boxes[:, :2] + stats[:, [cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT]]
+        return boxes
+
+    def results(self, source, conf=None, track=False):
+        images = [source] if isinstance(source, np.ndarray) else list(source)
+        results = []
+        for image in images:
+            start = cv2.getTickCount()
+            boxes = self.detect(image)
+            scores = np.full(len(boxes), 0.9)
+            if self.kind == "action":
+                classes = ((boxes[:, 0] + boxes[:, 2]) / 2 * ACTION_BANDS // image.shape[1]) % self.num_action_classes
+            else:
+                classes = np.zeros(len(boxes))
+            track_ids = None
+            if track:
+                centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+                track_ids = self.predictor.trackers[0].update(centers, MAX_TRACK_DISTANCE * image.shape[1])
+            elapsed_ms = (cv2.getTickCount() - start) * 1000 / cv2.getTickFrequency()
+            keep = scores >= (conf or 0)
+            results.append(StubResult(StubBoxes(boxes[keep], scores[keep], classes[keep],
+                                                None if track_ids is None else np.asarray(track_ids)[keep]),
+                                      {"preprocess": 0.0, "inference": elapsed_ms, "postprocess": 0.0}))
+        return results
+
+    def predict(self, source, imgsz=None, conf=None, verbose=False, **kwargs):
+        return self.results(source, conf)
+
+    def track(self, source, tracker=None, imgsz=None, verbose=False, persist=False, classes=None, **kwargs):
+        if self.predictor is None or not persist:
+            self.predictor = SimpleNamespace(trackers=[StubTracker()])
+        return self.results(source, kwargs.get("conf"), track=True)
+
+
+def patch_models(num_action_classes=5):
+    """Context manager that makes every stage load a StubYOLO instead of a real checkpoint."""
+    return mock.patch("src.utils.backends.YOLO", partial(StubYOLO, num_action_classes=num_action_classes))
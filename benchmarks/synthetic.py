@@ -0,0 +1,93 @@
+import os
+import cv2
+import numpy as np
+from src.utils.video import create_video_writer
+
+# colours (BGR) of the synthetic court; the stub models in benchmarks.stub_models detect the ball and players by them
+FLOOR_COLOR = (70, 110, 60)
+COURT_COLOR = (60, 110, 170)
+LINE_COLOR = (255, 255, 255)
+BALL_COLOR = (0, 230, 255)
+PLAYER_COLOR = (40, 40, 200)
+DEFAULT_NUM_PLAYERS = 12
+RALLY_FRAMES = 45  # frames per ball arc between two touches
+
+
+def court_corners(width, height):
+    # court trapezoid seen from behind the baseline: top-left, top-right, bottom-right, bottom-left
+    return np.array([[0.3 * width, 0.3 * height], [0.7 * width, 0.3 * height],
+                     [0.9 * width, 0.92 * height], [0.1 * width, 0.92 * height]], dtype=np.int32)
+
+
+def write_court_mask(output_path, width, height):
+    # white court area (with a margin for feet on the lines) on black, like the real court masks
+    mask = np.zeros((height, width), dtype=np.uint8)
+    corners = court_corners(width, height)
+    cv2.fillPoly(mask, [corners], 255)
+    cv2.polylines(mask, [corners], True, 255, max(2, width // 100))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    cv2.imwrite(output_path, mask)
+    return output_path
+
+
+def ball_positions(num_frames, width, height, rng):
+    # the ball flies in parabolic arcs between random touch points on the court
+    positions = np.empty((num_frames, 2))
+    corners = court_corners(width, height).astype(np.float64)
+    start = rng.uniform(corners[0], corners[2])
+    for arc_start in range(0, num_frames, RALLY_FRAMES):
+        end = np.array([rng.uniform(corners[3][0], corners[2][0]), rng.uniform(corners[0][1], corners[2][1])])
+        t = np.linspace(0, 1, RALLY_FRAMES, endpoint=False)[:min(RALLY_FRAMES, num_frames - arc_start)]
+        apex = rng.uniform(0.1, 0.25) * height
+        positions[arc_start:arc_start + len(t), 0] = start[0] + (end[0] - start[0]) * t
+        positions[arc_start:arc_start + len(t), 1] = start[1] + (end[1] - start[1]) * t - 4 * apex * t * (1 - t)
+        start = end
+    return positions
+
+
+def player_positions(num_frames, num_players, width, height, rng):
+    # feet positions of players drifting around the court in smooth random walks, (num_frames, num_players, 2)
+    corners = court_corners(width, height).astype(np.float64)
+    low = np.array([corners[3][0] + 0.1 * width, corners[0][1] + 0.15 * height])
+    high = np.array([corners[2][0] - 0.1 * width, corners[2][1] - 0.02 * height])
+    feet = np.empty((num_frames, num_players, 2))
+    position = rng.uniform(low, high, size=(num_players, 2))
+    velocity = np.zeros((num_players, 2))
+    for frame_id in range(num_frames):
+        velocity = 0.9 * velocity + rng.normal(0, 0.002 * width, size=(num_players, 2))
+        position = np.clip(position + velocity, low, high)
+        feet[frame_id] = position
+    return feet
+
+
+def draw_frame(width, height, ball, feet):
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = FLOOR_COLOR
+    corners = court_corners(width, height)
+    cv2.fillPoly(frame, [corners], COURT_COLOR)
+    cv2.polylines(frame, [corners], True, LINE_COLOR, max(2, width // 400))
+    cv2.line(frame, tuple(((corners[0] + corners[3]) // 2).tolist()), tuple(((corners[1] + corners[2]) // 2).tolist()),
+             LINE_COLOR, max(2, width // 400))
+
+    player_w, player_h = max(4, int(0.025 * width)), max(8, int(0.14 * height))
+    for x, y in feet.astype(int):
+        cv2.rectangle(frame, (x - player_w // 2, y - player_h), (x + player_w // 2, y), PLAYER_COLOR, -1)
+    cv2.circle(frame, (int(ball[0]), int(ball[1])), max(3, int(0.012 * height)), BALL_COLOR, -1)
+    return frame
+
+
+def write_court_video(output_path, num_frames, width=1280, height=720, fps=30, num_players=DEFAULT_NUM_PLAYERS,
+                      seed=0):
+    """Write a synthetic volleyball video: a court with a ball flying in arcs and moving player blobs."""
+    rng = np.random.default_rng(seed)
+    balls = ball_positions(num_frames, width, height, rng)
+    feet = player_positions(num_frames, num_players, width, height, rng)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    writer = create_video_writer(output_path, fps, width, height)
+    try:
+        for frame_id in range(num_frames):
+            writer.write(draw_frame(width, height, balls[frame_id], feet[frame_id]))
+    finally:
+        writer.release()
+    return output_path
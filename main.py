@@ -1,6 +1,9 @@
 from argparse import ArgumentParser
+from src.batch import BatchRunner, find_videos
 from src.pipeline import VolleyballPipeline
+from src.stage_workers import CONCURRENCY_MODES
 from src.utils.io import load_config
+from src.utils.profiler import Profiler
 
 
 if __name__ == '__main__':
@@ -8,6 +11,26 @@ if __name__ == '__main__':
     parser = ArgumentParser(description="Volleyball Tracking and Action Prediction")
     parser.add_argument('-i', '--video_path', type=str, default='inputs/input_video.mp4', help="Path to input video")
     parser.add_argument('-c', '--config', type=str, default="config/config.yaml", help="Path to config file")
+    parser.add_argument('--single_pass', action='store_true',
+                        help="Decode the video once and run all models and visualization in the same pass")
+    parser.add_argument('--stream', type=str, default=None,
+                        help="Process a live source instead of a file: camera index, rtsp:// URL or a file to replay")
+    parser.add_argument('--stream_output', type=str, default="outputs/stream/results.jsonl",
+                        help="JSON lines output of the stream: file path or tcp://host:port")
+    parser.add_argument('--target_latency', type=float, default=None,
+                        help="Latency budget in seconds; frames that cannot meet it are skipped")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Replay a file stream at its frame rate, as a stand-in for a live feed")
+    parser.add_argument('--concurrent_stages', type=str, choices=CONCURRENCY_MODES, default=None,
+                        help="Run the stages concurrently in the single pass: off, threads or processes")
+    parser.add_argument('--profile', type=str, default=None,
+                        help="Record per-stage timings and write a report to this .json or .csv path")
+    parser.add_argument('--batch', type=str, default=None,
+                        help="Process every video of a directory, or of a manifest file with one path per line")
+    parser.add_argument('--batch_output', type=str, default="outputs/batch",
+                        help="Root directory of the batch; each video writes to its own subdirectory")
+    parser.add_argument('--batch_workers', type=int, default=None,
+                        help="Videos processed concurrently in a batch, each worker loads the models once")
     args = parser.parse_args()
 
     # Load config from YAML and update with command-line args
@@ -15,9 +38,40 @@ if __name__ == '__main__':
     config["video_path"] = args.video_path
     config["config_path"] = args.config
 
+    # concurrent stages share the decoded frames of the single pass
+    config["concurrent_stages"] = args.concurrent_stages or config.get("concurrent_stages", "off")
+    config["single_pass"] = args.single_pass or config.get("single_pass", False) or config["concurrent_stages"] != "off"
+
+    if args.batch is not None:
+        # finished videos are skipped, so rerunning the same command resumes an interrupted batch
+        num_workers = args.batch_workers or config.get("batch_workers", 1)
+        results = BatchRunner(config, args.batch_output, num_workers).run(find_videos(args.batch))
+        failed = [result for result in results if result["status"] == "failed"]
+        print(f"Batch finished: {len(results) - len(failed)} of {len(results)} videos done")
+        raise SystemExit(1 if failed else 0)
+
     # Run pipeline
     pipeline = VolleyballPipeline(config)
-    data = pipeline.run()
+    profiler = None
+    if args.profile:
+        profiler = Profiler()
+        pipeline.set_profiler(profiler)
+
+    if args.stream is not None:
+        # live mode: results are emitted per frame, nothing is saved at the end
+        target_latency = args.target_latency or config.get("target_latency", 0.5)
+        summary = pipeline.run_stream(args.stream, args.stream_output, target_latency, realtime=args.realtime)
+        print(f"Stream finished: {summary}")
+    elif config["single_pass"]:
+        # inference and visualization share one decode of the video
+        pipeline.run_single_pass(show=False, save=True)
+    else:
+        data = pipeline.run()
+
+        # Visualize results
+        pipeline.visualize(*data, show=False, save=True)
 
-    # Visualize results
-    pipeline.visualize(*data, show=False, save=True)
\ No newline at end of file
+    if profiler is not None:
+        # machine-readable report plus a summary table
+        report = profiler.save(args.profile)
+        print(profiler.summary_table(report))
\ No newline at end of file
@@ -0,0 +1,142 @@
+from src.pipeline import VolleyballPipeline
+from src.parallel import spawn_context
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
+import time
+import traceback
+
+# constants for easy configuration
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+DONE_MARKER = "done.json"  # written to a job's output directory once all of its outputs are saved
+BATCH_SUMMARY = "batch_summary.json"
+
+_pipeline = None  # one pipeline per worker process, models are loaded once and reused for every job
+
+
+def find_videos(source):
+    # videos of a directory, or a manifest file with one video path per line ('#' starts a comment)
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if name.lower().endswith(VIDEO_EXTENSIONS))
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    videos = []
+    with open(source) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                # relative paths are relative to the manifest
+                videos.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return videos
+
+
+def job_names(videos):
+    # output namespace per video: the file stem, plus a short path hash when stems collide
+    stems = [os.path.splitext(os.path.basename(video))[0] for video in videos]
+    names = []
+    for video, stem in zip(videos, stems):
+        if stems.count(stem) > 1:
+            stem = f"{stem}_{hashlib.blake2b(os.path.abspath(video).encode(), digest_size=4).hexdigest()}"
+        names.append(stem)
+    return names
+
+
+def video_signature(video_path):
+    # cheap identity of the input, so a replaced video is processed again on resume
+    stat = os.stat(video_path)
+    return {"video_path": os.path.abspath(video_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def is_done(video_path, output_dir):
+    marker = os.path.join(output_dir, DONE_MARKER)
+    if not os.path.isfile(marker):
+        return False
+    with open(marker) as f:
+        return json.load(f).get("video") == video_signature(video_path)
+
+
+def _init_batch_worker(config, num_threads=None):
+    # build the worker's pipeline once; every job only swaps the video and output paths
+    global _pipeline
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+    _pipeline = VolleyballPipeline(dict(config))
+
+
+def _run_job(video_path, output_dir, visualize=True):
+    # process one video into its own output directory and mark it done
+    start_time = time.perf_counter()
+    try:
+        _pipeline.set_video(video_path, output_dir)
+        if _pipeline.config.get("single_pass"):
+            _pipeline.run_single_pass(show=False, save=visualize)
+        else:
+            data = _pipeline.run()
+            if visualize:
+                _pipeline.visualize(*data, show=False, save=True)
+    except Exception:
+        return {"video_path": video_path, "output_dir": output_dir, "status": "failed",
+                "error": traceback.format_exc(), "seconds": round(time.perf_counter() - start_time, 2)}
+
+    result = {"video_path": video_path, "output_dir": output_dir, "status": "done",
+              "seconds": round(time.perf_counter() - start_time, 2)}
+    with open(os.path.join(output_dir, DONE_MARKER), "w") as f:
+        json.dump({"video": video_signature(video_path), "seconds": result["seconds"]}, f)
+    return result
+
+
+class BatchRunner:
+    # works through a queue of videos with a pool of workers that each load the models once
+    def __init__(self, config, output_root, num_workers=1, visualize=True):
+        self.config = config
+        self.output_root = output_root
+        self.num_workers = max(1, num_workers)
+        self.visualize = visualize  # also render output_visualized.mp4 for every video
+
+    def jobs(self, videos):
+        # (video, output directory) of every video that is not already done
+        jobs, skipped = [], []
+        for video, name in zip(videos, job_names(videos)):
+            output_dir = os.path.join(self.output_root, name)
+            (skipped if is_done(video, output_dir) else jobs).append((video, output_dir))
+        return jobs, skipped
+
+    def run(self, videos):
+        """Process every video that has no done marker yet; failed jobs are reported and left for the next run."""
+        jobs, skipped = self.jobs(videos)
+        print(f"Batch: {len(jobs)} videos to process, {len(skipped)} already done")
+
+        results = [{"video_path": video, "output_dir": output_dir, "status": "skipped"} for video, output_dir in skipped]
+        if self.num_workers == 1 or len(jobs) <= 1:
+            if jobs:
+                _init_batch_worker(self.config)
+            for video, output_dir in jobs:
+                results.append(self.report(_run_job(video, output_dir, self.visualize)))
+        else:
+            # ByteTrack ids are process-global, so concurrent jobs need separate processes rather than threads
+            num_workers = min(self.num_workers, len(jobs))
+            num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+            context = spawn_context()
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_batch_worker,
+                                     initargs=(self.config, num_threads)) as executor:
+                futures = [executor.submit(_run_job, video, output_dir, self.visualize) for video, output_dir in jobs]
+                for future in as_completed(futures):
+                    results.append(self.report(future.result()))
+
+        os.makedirs(self.output_root, exist_ok=True)
+        summary_path = os.path.join(self.output_root, BATCH_SUMMARY)
+        with open(summary_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Batch summary saved to {summary_path}")
+        return results
+
+    @staticmethod
+    def report(result):
+        if result["status"] == "failed":
+            print(f"Failed: {result['video_path']}\n{result['error']}")
+        else:
+            print(f"Done: {result['video_path']} -> {result['output_dir']} ({result['seconds']} s)")
+        return result
@@ -1,33 +1,178 @@
+from argparse import ArgumentParser
+import os
+from collections import Counter
 import cv2
-from ultralytics.solutions import Heatmap
+import numpy as np
+from src.utils.columnar import TrackStore
+from src.utils.img_utils import foot_points
+from src.utils.io import load_config, load_tracking_data
+from src.utils.records import RecordReader
+from src.utils.video import FrameReader, get_video_info
 
-cap = cv2.VideoCapture("../inputs/input_video.mp4")
-assert cap.isOpened(), "Error reading video file"
+# constants for easy configuration
+DEFAULT_CELL_SIZE = 8  # pixels per heatmap cell
+DEFAULT_BLUR = 5  # gaussian blur of the rendered heatmap, in cells
+DEFAULT_ALPHA = 0.6  # weight of the heatmap over the background frame
+KINDS = ("ball", "player")
 
-# Video writer
-w, h, fps = (int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS))
-video_writer = cv2.VideoWriter("../outputs/videos/heatmap_output.avi", cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
 
-# For object counting with heatmap, you can pass region points.
-region_points = [[53, 1042], [1914, 1027], [1916, 974], [1256, 630], [470, 627]]   # polygon points
+class HeatmapAccumulator:
+    # position counts on a grid of cell_size cells: ball centers and player foot positions for the whole
+    # video, per player track and per window of window_size frames; counts are added incrementally and
+    # images are only rendered at the end
+    def __init__(self, frame_width, frame_height, cell_size=DEFAULT_CELL_SIZE, window_size=0):
+        self.cell_size = cell_size
+        self.shape = (-(-frame_height // cell_size), -(-frame_width // cell_size))
+        self.window_size = window_size  # frames per time window, 0 keeps no per-window counts
+        self.totals = {kind: np.zeros(self.shape, dtype=np.uint32) for kind in KINDS}
+        self.tracks = {}  # track_id -> Counter of flat cell index -> player count, sparse as a track covers few cells
+        self.windows = {kind: {} for kind in KINDS}  # window index -> counts
 
-# Initialize heatmap object
-heatmap = Heatmap(model="../models/ball_best.pt", colormap=cv2.COLORMAP_JET)
+    def cells(self, points):
+        # flat cell index of each (x, y) point, and which points fall inside the grid
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cols = np.floor(points[:, 0] / self.cell_size).astype(np.int64)
+        rows = np.floor(points[:, 1] / self.cell_size).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return rows * self.shape[1] + cols, inside
 
-# Process video
-while cap.isOpened():
-    success, im0 = cap.read()
+    def add(self, kind, frame_ids, points, track_ids=None):
+        """Add positions of one stage; frame_ids and track_ids are per point, track_ids only for players."""
+        flat, inside = self.cells(points)
+        flat, frame_ids = flat[inside], np.asarray(frame_ids, dtype=np.int64).reshape(-1)[inside]
+        if len(flat) == 0:
+            return
+        np.add.at(self.totals[kind].reshape(-1), flat, 1)
 
-    if not success:
-        print("Video frame is empty or processing is complete.")
-        break
+        if self.window_size:
+            self.add_grouped(self.windows[kind], frame_ids // self.window_size, flat)
+        if track_ids is not None:
+            self.add_sparse(np.asarray(track_ids, dtype=np.int64).reshape(-1)[inside], flat)
 
-    results = heatmap(im0)
+    def add_grouped(self, grids, group_ids, flat):
+        # add each point to the grid of its group; points are sorted by group once so every group is one slice
+        order = np.argsort(group_ids, kind="stable")
+        group_ids, flat = group_ids[order], flat[order]
+        unique_ids, starts = np.unique(group_ids, return_index=True)
+        for group_id, start, end in zip(unique_ids.tolist(), starts, list(starts[1:]) + [len(flat)]):
+            counts = grids.setdefault(group_id, np.zeros(self.shape, dtype=np.uint32))
+            counts.reshape(-1)[:] += np.bincount(flat[start:end], minlength=counts.size).astype(np.uint32)
 
-    # print(results)  # access the output
+    def add_sparse(self, track_ids, flat):
+        # add each point to the sparse counts of its track
+        pairs, counts = np.unique(np.stack([track_ids, flat], axis=1), axis=0, return_counts=True)
+        for (track_id, cell), count in zip(pairs.tolist(), counts.tolist()):
+            self.tracks.setdefault(track_id, Counter())[cell] += count
 
-    video_writer.write(results.plot_im)  # write the processed frame.
+    def track_counts(self, track_id):
+        # dense counts of one player track
+        counts = np.zeros(self.shape, dtype=np.uint32)
+        cells = self.tracks.get(track_id, {})
+        counts.reshape(-1)[list(cells)] = list(cells.values())
+        return counts
 
-cap.release()
-video_writer.release()
-cv2.destroyAllWindows()  # destroy all opened windows
+    def update(self, frame_id, ball_info=None, players=None):
+        # one frame of results, e.g. while streaming
+        if ball_info and ball_info.get("center") is not None:
+            self.add("ball", [frame_id], [ball_info["center"]])
+        if players:
+            track_ids = [int(track_id) for track_id in players]
+            boxes = [player["bbox"] for player in players.values()]
+            self.add("player", [frame_id] * len(track_ids), foot_points(boxes), track_ids)
+
+    def add_store(self, store):
+        # a whole stage's results at once from the columnar layout
+        columns = store.columns
+        if store.kind == "ball":
+            valid = ~np.isnan(columns["center"]).any(axis=1)
+            self.add("ball", columns["frame_id"][valid], columns["center"][valid])
+        elif store.kind == "player":
+            self.add("player", columns["frame_id"], foot_points(columns["bbox"]), columns["track_id"])
+        else:
+            raise ValueError(f"No heatmap for {store.kind} data")
+
+    def add_tracking_data(self, data):
+        # tracking data as returned by the stages: a TrackStore, a RecordReader or a {kind: {frame_id: info}} dict
+        if isinstance(data, RecordReader):
+            # streamed frame by frame, the records file is never loaded as a whole
+            if data.kind not in KINDS:
+                raise ValueError(f"No heatmap for {data.kind} data")
+            for frame_id, info in data:
+                if data.kind == "ball":
+                    self.update(frame_id, ball_info=info)
+                else:
+                    self.update(frame_id, players=info)
+            return
+        self.add_store(data if isinstance(data, TrackStore) else TrackStore.from_tracking_data(data))
+
+    def render(self, counts, background=None, blur=DEFAULT_BLUR, alpha=DEFAULT_ALPHA):
+        # colour-mapped heatmap at frame resolution, blended over background when given
+        heat = counts.astype(np.float32)
+        if blur:
+            heat = cv2.GaussianBlur(heat, (0, 0), blur)
+        if heat.max() > 0:
+            heat = heat / heat.max()
+        heat = cv2.resize((heat * 255).astype(np.uint8),
+                          (self.shape[1] * self.cell_size, self.shape[0] * self.cell_size),
+                          interpolation=cv2.INTER_LINEAR)
+        image = cv2.applyColorMap(heat, cv2.COLORMAP_JET)
+        if background is None:
+            return image
+        image = image[:background.shape[0], :background.shape[1]]
+        return cv2.addWeighted(background, 1 - alpha, image, alpha, 0)
+
+    def save(self, output_dir, background=None):
+        """Write all counts to heatmaps.npz and render the ball, player and per-window images."""
+        os.makedirs(output_dir, exist_ok=True)
+        arrays = dict(self.totals)
+        # per-track counts stay sparse: track_ids[i] has the cells and counts at track_offsets[i]:track_offsets[i + 1]
+        tracks = [self.tracks[track_id] for track_id in sorted(self.tracks)]
+        arrays["track_ids"] = np.array(sorted(self.tracks), dtype=np.int64)
+        arrays["track_offsets"] = np.cumsum([0] + [len(cells) for cells in tracks], dtype=np.int64)
+        arrays["track_cells"] = np.array([cell for cells in tracks for cell in cells], dtype=np.int64)
+        arrays["track_counts"] = np.array([count for cells in tracks for count in cells.values()], dtype=np.uint32)
+        arrays.update({f"{kind}_window_{window_id}": counts
+                       for kind, windows in self.windows.items() for window_id, counts in windows.items()})
+        np.savez_compressed(os.path.join(output_dir, "heatmaps.npz"), cell_size=self.cell_size, **arrays)
+
+        for kind, counts in self.totals.items():
+            cv2.imwrite(os.path.join(output_dir, f"{kind}_heatmap.png"), self.render(counts, background))
+        for kind, windows in self.windows.items():
+            for window_id, counts in sorted(windows.items()):
+                cv2.imwrite(os.path.join(output_dir, f"{kind}_heatmap_{window_id:04d}.png"),
+                            self.render(counts, background))
+        print(f"Heatmaps saved to {output_dir}")
+
+
+def first_frame(video_path):
+    # background for the rendered heatmaps
+    with FrameReader(video_path, 0, 1) as reader:
+        for _, frame in reader:
+            return frame
+    return None
+
+
+def build_heatmaps(video_path, ball_data, player_data, output_dir, cell_size=DEFAULT_CELL_SIZE, window_size=0):
+    """Accumulate heatmaps from finished ball and player results and save them, without running any model."""
+    info = get_video_info(video_path)
+    accumulator = HeatmapAccumulator(info["width"], info["height"], cell_size, window_size)
+    accumulator.add_tracking_data(ball_data)
+    accumulator.add_tracking_data(player_data)
+    accumulator.save(output_dir, first_frame(video_path))
+    return accumulator
+
+
+if __name__ == '__main__':
+    # heatmaps from the tracking data saved by a previous pipeline run
+    parser = ArgumentParser(description="Ball and player heatmaps from saved tracking data")
+    parser.add_argument('-c', '--config', type=str, default="config/config.yaml", help="Path to config file")
+    parser.add_argument('-i', '--video_path', type=str, default=None, help="Video the tracking data belongs to")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    video_path = args.video_path or config["video_path"]
+    ball_data, player_data = load_tracking_data(config["ball_data"]), load_tracking_data(config["player_data"])
+    if ball_data is None or player_data is None:
+        raise SystemExit("Run the pipeline first: no saved ball or player data")
+    build_heatmaps(video_path, ball_data, player_data, config.get("heatmap_dir", "outputs/heatmaps"),
+                   config.get("heatmap_cell_size", DEFAULT_CELL_SIZE), config.get("heatmap_window", 0))
@@ -0,0 +1,188 @@
+from src.trackers.player_tracker import PlayerTracker
+from src.trackers.ball_tracker import BallTracker
+from src.predictors.action_predictor import ActionPredictor, DEFAULT_FRAME_WINDOW
+from src.utils.img_utils import box_iou
+from src.utils.video import FrameReader, get_video_info, batched
+from src.utils.stride import DEFAULT_MOTION_THRESHOLD
+from src.utils.backends import backend_options, stage_device
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+import multiprocessing
+import numpy as np
+import os
+
+# constants for easy configuration
+DEFAULT_CHUNK_OVERLAP = 30  # frames decoded before each chunk to warm up tracker state
+DEFAULT_IOU_THRESHOLD = 0.5  # minimum IoU for two tracks to be the same player
+
+
+def spawn_context():
+    # multiprocessing context of every worker pool: spawn keeps torch and the video decoder from being forked
+    # in an initialised state
+    return multiprocessing.get_context("spawn")
+
+
+def stride_options(config, stage):
+    # frame skipping of the player or action stage from the pipeline config
+    return {"stride": config.get(f"{stage}_stride", 1), "adaptive_stride": config.get("adaptive_stride", False),
+            "motion_threshold": config.get("motion_threshold", DEFAULT_MOTION_THRESHOLD)}
+
+
+def build_stage(stage, config, video_path=None):
+    # create the tracker or predictor for one stage from the pipeline config
+    video_path = video_path or config["video_path"]
+    batch_size = config.get("batch_size", 1)
+    if stage == "ball":
+        return BallTracker(config["ball_model_path"], video_path, config["mask_path"], batch_size=batch_size,
+                           roi_size=config.get("ball_roi_size", 0), tile_fallback=config.get("ball_tile_fallback", False),
+                           trajectory=config.get("ball_trajectory", "linear"),
+                           backend_options=backend_options(config, "ball"), device=stage_device(config, "ball"))
+    if stage == "player":
+        return PlayerTracker(config["player_model_path"], video_path, config["mask_path"], batch_size=batch_size,
+                             **stride_options(config, "player"), backend_options=backend_options(config, "player"),
+                             device=stage_device(config, "player"))
+    if stage == "action":
+        return ActionPredictor(config["action_model_path"], video_path, action_classes=config["action_classes"],
+                               mask_path=config["mask_path"], batch_size=batch_size,
+                               frame_window=config.get("action_frame_window", DEFAULT_FRAME_WINDOW),
+                               **stride_options(config, "action"), backend_options=backend_options(config, "action"),
+                               device=stage_device(config, "action"))
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def stage_results(stage, tracker):
+    # per-frame result dict of a stage, keyed by frame id
+    if stage == "action":
+        return tracker.action_data["action"]
+    return tracker.tracking_data[stage]
+
+
+def stage_data(stage, tracker):
+    # everything a stage keeps for the video: the per-frame results, and for players the frames the stride skipped
+    return tracker.action_data if stage == "action" else tracker.tracking_data
+
+
+def interpolated_frames(stage, tracker):
+    # ids of player frames filled in by the stride instead of inferred, an empty list for the other stages
+    return tracker.tracking_data["interpolated_frames"] if stage == "player" else []
+
+
+def split_segments(num_frames, num_chunks):
+    # split [0, num_frames) into contiguous, roughly equal frame ranges
+    bounds = np.linspace(0, num_frames, num_chunks + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _init_worker(num_threads):
+    # keep each worker on its share of the cores instead of every process using all of them
+    import torch
+    torch.set_num_threads(num_threads)
+
+
+def _process_segment(stage, config, start, end, overlap):
+    # run one stage over [start - overlap, end) in a worker process
+    tracker = build_stage(stage, config)
+    with FrameReader(config["video_path"], max(0, start - overlap), end) as reader:
+        tracker.set_frame_size(reader.frame_width, reader.frame_height)
+
+        for frame_ids, frames in batched(reader, tracker.batch_size):
+            tracker.process_batch(frame_ids, frames)
+    return stage_results(stage, tracker), interpolated_frames(stage, tracker)
+
+
+def reconcile_track_ids(prev_frames, next_frames, overlap_ids, next_free_id, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    # map track ids of a new chunk onto the previous chunk by IoU over the frames both chunks processed
+    scores = defaultdict(float)
+    for frame_id in overlap_ids:
+        prev_players, next_players = prev_frames.get(frame_id), next_frames.get(frame_id)
+        if not prev_players or not next_players:
+            continue
+
+        prev_ids, next_ids = list(prev_players), list(next_players)
+        ious = box_iou([next_players[t]["bbox"] for t in next_ids], [prev_players[t]["bbox"] for t in prev_ids])
+        for i, j in zip(*np.nonzero(ious >= iou_threshold)):
+            scores[(next_ids[i], prev_ids[j])] += ious[i, j]
+
+    # greedy one-to-one assignment, strongest accumulated overlap first
+    mapping, used = {}, set()
+    for (next_id, prev_id), _ in sorted(scores.items(), key=lambda item: -item[1]):
+        if next_id in mapping or prev_id in used:
+            continue
+        mapping[next_id] = prev_id
+        used.add(prev_id)
+
+    # tracks that only exist in the new chunk get fresh ids
+    for players in next_frames.values():
+        for track_id in players:
+            if track_id not in mapping:
+                mapping[track_id] = next_free_id
+                next_free_id += 1
+
+    return mapping, next_free_id
+
+
+def remap_track_ids(players, mapping, next_free_id):
+    # rename one frame's players through a reconciled mapping; tracks that appear after the overlap get fresh ids
+    remapped = {}
+    for track_id, player in players.items():
+        if track_id not in mapping:
+            mapping[track_id] = next_free_id
+            next_free_id += 1
+        remapped[mapping[track_id]] = player
+    return remapped, next_free_id
+
+
+class ParallelProcessor:
+    def __init__(self, config, num_workers=None, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+        self.config = config
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunk_overlap = chunk_overlap
+
+    def process_stage(self, stage):
+        """Process one stage over time chunks in separate worker processes and merge with global frame ids;
+        returns the stage's data, e.g. {"ball": {frame_id: info}}."""
+        num_frames = get_video_info(self.config["video_path"])["num_frames"]
+        segments = split_segments(num_frames, self.num_workers)
+
+        # action predictions are stateless, ball and player trackers warm up on the overlap
+        overlap = 0 if stage == "action" else self.chunk_overlap
+        num_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+
+        context = spawn_context()
+        with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(num_threads,)) as executor:
+            # the last chunk reads to EOF since the container frame count is only an estimate
+            futures = [executor.submit(_process_segment, stage, self.config, start,
+                                       None if i == len(segments) - 1 else end, overlap)
+                       for i, (start, end) in enumerate(segments)]
+            chunks, chunk_interpolated = zip(*[future.result() for future in futures])
+
+        if stage == "player":
+            # overlap frames belong to the previous chunk
+            interpolated = [frame_id for (start, _), frame_ids in zip(segments, chunk_interpolated)
+                            for frame_id in frame_ids if frame_id >= start]
+            return {"player": self.merge_player_chunks(segments, chunks), "interpolated_frames": interpolated}
+
+        merged = {}
+        for (start, _), chunk in zip(segments, chunks):
+            merged.update({frame_id: info for frame_id, info in chunk.items() if frame_id >= start})
+        return {stage: merged}
+
+    def merge_player_chunks(self, segments, chunks):
+        # join chunks in time order, keeping ByteTrack ids continuous across chunk boundaries
+        merged = {}
+        next_free_id = 1
+        for (start, _), chunk in zip(segments, chunks):
+            if merged:
+                overlap_ids = [frame_id for frame_id in chunk if frame_id < start]
+                mapping, next_free_id = reconcile_track_ids(merged, chunk, overlap_ids, next_free_id)
+            else:
+                track_ids = {track_id for players in chunk.values() for track_id in players}
+                mapping = {track_id: track_id for track_id in track_ids}
+                next_free_id = max(track_ids, default=0) + 1
+
+            # overlap frames belong to the previous chunk and are only used for matching
+            for frame_id, players in chunk.items():
+                if frame_id >= start:
+                    merged[frame_id] = {mapping[track_id]: info for track_id, info in players.items()}
+        return merged
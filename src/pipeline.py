@@ -1,143 +1,422 @@
 from src.trackers.player_tracker import PlayerTracker
 from src.trackers.ball_tracker import BallTracker
-from src.predictors.action_predictor import ActionPredictor
+from src.predictors.action_predictor import ActionPredictor, DEFAULT_FRAME_WINDOW
+from src.predictors.action_aggregator import ActionAggregator
+from src.utils.columnar import TrackStore, save_records_columnar
+from src.utils.io import load_tracking_data, save_json_data, columnar_path
+from src.utils.profiler import NULL_PROFILER
+from src.stage_cache import StageCache
+from src.stage_records import StageRecorder
+from src.utils.records import RecordReader, save_records_json, DEFAULT_FLUSH_INTERVAL
+from src.utils.cache import DEFAULT_SEGMENT_SIZE
+from src.parallel import ParallelProcessor, DEFAULT_CHUNK_OVERLAP, stride_options, stage_data
+from src.stage_workers import stage_executor
+from src.renderer import Renderer
+from src.utils.backends import backend_options, stage_device
+from src.heatmap import HeatmapAccumulator, build_heatmaps, DEFAULT_CELL_SIZE
+from src.utils.video import open_frame_reader, batched, create_video_writer, OrderedWriter, DEFAULT_FFMPEG_CODEC
+from src.streaming import LatestFrameReader, FrameSkipPolicy, StreamMetrics, JsonLinesEmitter, \
+    DEFAULT_TARGET_LATENCY, DEFAULT_METRICS_INTERVAL
+from tqdm import tqdm
 import cv2
 import os
-import numpy as np
+import time
+
+
+def frame_entry(data, kind, frame_id):
+    # per-frame lookup; columnar stores slice by offset, records files are read sequentially,
+    # data loaded from JSON uses str keys, fresh results use int keys
+    if isinstance(data, (TrackStore, RecordReader)):
+        return data.frame_entry(frame_id)
+    frames = data[kind]
+    entry = frames.get(str(frame_id))
+    return entry if entry is not None else frames.get(frame_id)
+
+
+def frame_ids(data, kind):
+    # sorted frame ids of a stage's results
+    if isinstance(data, TrackStore):
+        return list(range(data.num_frames))
+    if isinstance(data, RecordReader):
+        return list(data.frame_ids())
+    return sorted(int(frame_id) for frame_id in data[kind])
 
 
 class VolleyballPipeline:
     def __init__(self, config):
         self.config = config
+        self.batch_size = self.config.get("batch_size", 1)
+        self.queue_size = self.config.get("queue_size", 0)
+        self.output_format = self.config.get("output_format", "json")
+        self.action_output = self.config.get("action_output", "frames")  # "frames", "events" or "both"
         self.ball_tracker = BallTracker(self.config["ball_model_path"], self.config["video_path"],
-                                        self.config['mask_path'])
+                                        self.config['mask_path'], batch_size=self.batch_size, queue_size=self.queue_size,
+                                        output_format=self.output_format, roi_size=self.config.get("ball_roi_size", 0),
+                                        tile_fallback=self.config.get("ball_tile_fallback", False),
+                                        trajectory=self.config.get("ball_trajectory", "linear"),
+                                        smoothing=self.config.get("ball_smoothing", False),
+                                        backend_options=backend_options(self.config, "ball"),
+                                        device=stage_device(self.config, "ball"))
         self.player_tracker = PlayerTracker(self.config["player_model_path"], self.config["video_path"],
-                                        self.config['mask_path'])
+                                        self.config['mask_path'], batch_size=self.batch_size, queue_size=self.queue_size,
+                                        output_format=self.output_format, **stride_options(self.config, "player"),
+                                        backend_options=backend_options(self.config, "player"),
+                                        device=stage_device(self.config, "player"))
         self.action_predictor = ActionPredictor(self.config["action_model_path"], self.config["video_path"],
-                                                action_classes=self.config["action_classes"], mask_path=self.config['mask_path'])
+                                                action_classes=self.config["action_classes"], mask_path=self.config['mask_path'],
+                                                batch_size=self.batch_size, queue_size=self.queue_size,
+                                                output_format=self.output_format,
+                                                frame_window=self.config.get("action_frame_window", DEFAULT_FRAME_WINDOW),
+                                                **stride_options(self.config, "action"),
+                                                backend_options=backend_options(self.config, "action"),
+                                                device=stage_device(self.config, "action"))
+        self.action_predictor.save_frames = self.action_output != "events"
+        self.renderer = Renderer(self.config["action_classes"])
+        self.set_profiler(NULL_PROFILER)
+
+    def create_writer(self, output_video_path, reader):
+        # video encoder selected in the config ("mp4v" or "ffmpeg")
+        return create_video_writer(output_video_path, reader.fps, reader.frame_width, reader.frame_height,
+                                   encoder=self.config.get("video_encoder", "mp4v"),
+                                   codec=self.config.get("ffmpeg_codec", DEFAULT_FFMPEG_CODEC))
+
+    def set_profiler(self, profiler):
+        # share one profiler between the pipeline and all stages
+        self.profiler = profiler
+        self.ball_tracker.profiler = profiler
+        self.player_tracker.profiler = profiler
+        self.action_predictor.profiler = profiler
+
+    def set_video(self, video_path, output_root=None):
+        # switch to another video keeping the loaded models; output_root gives the video its own output paths
+        self.config["video_path"] = video_path
+        tracking_dir = action_dir = None
+        if output_root is not None:
+            tracking_dir = os.path.join(output_root, "tracking_data")
+            action_dir = os.path.join(output_root, "action_data")
+            self.config["ball_data"] = os.path.join(tracking_dir, "ball.json")
+            self.config["player_data"] = os.path.join(tracking_dir, "player.json")
+            self.config["action_data"] = os.path.join(action_dir, "action.json")
+            self.config["output_dir"] = os.path.join(output_root, "videos")
+            self.config["heatmap_dir"] = os.path.join(output_root, "heatmaps")
+        self.ball_tracker.set_video(video_path, tracking_dir)
+        self.player_tracker.set_video(video_path, tracking_dir)
+        self.action_predictor.set_video(video_path, action_dir)
 
     def run(self):
         """Run the full pipeline: track ball, track players, predict actions."""
-        ball_data = self.ball_tracker.process_video(json_path=self.config['ball_data'])
-        player_data = self.player_tracker.process_video(json_path=self.config['player_data'])
-        action_data = self.action_predictor.process_video(json_path=self.config['action_data'])
-        return ball_data, player_data, action_data
+        if self.config.get("cache_dir"):
+            data = self.run_cached()
+        elif self.config.get("record_output", False):
+            data = self.run_recorded()
+        elif self.config.get("num_workers", 0) > 0:
+            data = self.run_parallel(self.config["num_workers"])
+        else:
+            ball_data = self.ball_tracker.process_video(json_path=self.config['ball_data'])
+            player_data = self.player_tracker.process_video(json_path=self.config['player_data'])
+            action_data = self.action_predictor.process_video(json_path=self.config['action_data'])
+            data = ball_data, player_data, action_data
+        self.finish_stages(*data)
+        return data
+
+    def finish_stages(self, ball_data, player_data, action_data):
+        # stages that only need the finished per-frame results of the detection stages
+        if self.action_output in ("events", "both"):
+            self.aggregate_actions(player_data, action_data)
+        if self.config.get("heatmaps", False):
+            with self.profiler.stage("heatmap", "accumulate"):
+                build_heatmaps(self.config["video_path"], ball_data, player_data,
+                               self.config.get("heatmap_dir", "outputs/heatmaps"),
+                               self.config.get("heatmap_cell_size", DEFAULT_CELL_SIZE),
+                               self.config.get("heatmap_window", 0))
+
+    def action_aggregator(self):
+        return ActionAggregator(self.config["action_classes"], window=self.action_predictor.frame_window,
+                                iou_threshold=self.config.get("action_iou_threshold", 0.3))
+
+    def aggregate_actions(self, player_data, action_data):
+        """Match actions to player tracks, vote over frame_window frames and save the resulting action events."""
+        aggregator = self.action_aggregator()
+        with self.profiler.stage("action", "aggregate"):
+            for frame_id in frame_ids(action_data, "action"):
+                aggregator.update(frame_id, frame_entry(player_data, "player", frame_id),
+                                  frame_entry(action_data, "action", frame_id))
+            events = aggregator.finish()
+
+        output_path = os.path.join(os.path.dirname(self.config["action_data"]), "action_events.json")
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        save_json_data({"action_events": events}, output_path)
+        return events
+
+    def run_cached(self):
+        """Run each stage through the result cache, recomputing only segments whose inputs changed."""
+        stage_cache = StageCache(self.config["cache_dir"],
+                                 max_size=int(self.config.get("cache_max_size_gb", 20) * 1024 ** 3),
+                                 segment_size=self.config.get("cache_segment_size", DEFAULT_SEGMENT_SIZE))
+        stages = [("ball", self.ball_tracker, self.ball_tracker.tracking_data),
+                  ("player", self.player_tracker, self.player_tracker.tracking_data),
+                  ("action", self.action_predictor, self.action_predictor.action_data)]
+
+        results = []
+        for stage, tracker, data in stages:
+            data[stage] = stage_cache.process(stage, tracker, self.config["video_path"])
+            tracker.save_data()
+            results.append(data)
+        return tuple(results)
+
+    def run_recorded(self):
+        """Stream each stage's results to an append-only records file with checkpoints, resuming after a crash."""
+        recorder = StageRecorder(self.config.get("record_flush_interval", DEFAULT_FLUSH_INTERVAL))
+        stages = [("ball", self.ball_tracker, 'ball_data'), ("player", self.player_tracker, 'player_data'),
+                  ("action", self.action_predictor, 'action_data')]
+
+        results = []
+        for stage, tracker, json_key in stages:
+            # reuse saved results like process_video does
+            saved_data = load_tracking_data(self.config[json_key])
+            if saved_data is not None:
+                results.append(saved_data)
+                continue
+
+            records_path = os.path.join(tracker.output_dir, f"{stage}.jsonl")
+            reader = recorder.process(stage, tracker, self.config["video_path"], records_path)
+            results.append(self.save_records(stage, tracker, reader))
+        return tuple(results)
+
+    def save_records(self, stage, tracker, reader):
+        # write a finished records file in the configured output format, frame by frame
+        if stage == "action" and not tracker.save_frames:
+            return reader
+        if stage == "ball" and tracker.smoothing:
+            # the ball track is one small entry per frame, so it is smoothed in memory
+            tracker.tracking_data["ball"] = dict(reader)
+            tracker.save_data()
+            return tracker.tracking_data
+
+        output_path = os.path.join(tracker.output_dir, f"{stage}.json")
+        with self.profiler.stage(stage, "serialize"):
+            if self.output_format in ("columnar", "both"):
+                save_records_columnar(reader, columnar_path(output_path))
+            if self.output_format in ("json", "both"):
+                save_records_json(reader, output_path)
+        return reader
+
+    def run_parallel(self, num_workers=None):
+        """Run each stage over time chunks of the video in a pool of worker processes."""
+        processor = ParallelProcessor(self.config, num_workers, self.config.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP))
+        stages = [("ball", self.ball_tracker, self.ball_tracker.tracking_data, 'ball_data'),
+                  ("player", self.player_tracker, self.player_tracker.tracking_data, 'player_data'),
+                  ("action", self.action_predictor, self.action_predictor.action_data, 'action_data')]
+
+        results = []
+        for stage, tracker, data, json_key in stages:
+            # reuse saved results like process_video does
+            saved_data = load_tracking_data(self.config[json_key])
+            if saved_data is not None:
+                results.append(saved_data)
+                continue
+
+            data.update(processor.process_stage(stage))
+            tracker.save_data()
+            results.append(data)
+        return tuple(results)
+
+    def run_stream(self, source, output, target_latency=DEFAULT_TARGET_LATENCY, realtime=False,
+                   metrics_interval=DEFAULT_METRICS_INTERVAL):
+        """Process a live stream and emit per-frame results as JSON lines within a latency budget."""
+        reader = LatestFrameReader(source, realtime)
+        for tracker in self.stage_trackers().values():
+            tracker.set_frame_size(reader.frame_width, reader.frame_height)
+
+        policy = FrameSkipPolicy(target_latency)
+        metrics = StreamMetrics()
+        emitter = JsonLinesEmitter(output)
+        aggregator = self.action_aggregator() if self.action_output in ("events", "both") else None
+        heatmap = HeatmapAccumulator(reader.frame_width, reader.frame_height,
+                                     self.config.get("heatmap_cell_size", DEFAULT_CELL_SIZE),
+                                     self.config.get("heatmap_window", 0)) if self.config.get("heatmaps", False) else None
+        last_metrics_time = time.monotonic()
+        try:
+            while True:
+                item = reader.read()
+                if item is None:
+                    break  # end of stream
+
+                # skip frames that can no longer make the latency budget
+                frame_id, frame, capture_time = item
+                if not policy.should_process(time.monotonic() - capture_time):
+                    metrics.num_skipped += 1
+                    continue
+
+                start_time = time.monotonic()
+                ball_info = self.ball_tracker.process_batch([frame_id], [frame])[0]
+                player_info = self.player_tracker.process_batch([frame_id], [frame])[0]
+                action_info = self.action_predictor.process_batch([frame_id], [frame])[0]
+
+                # results are emitted rather than accumulated for the whole stream
+                self.ball_tracker.tracking_data["ball"].pop(frame_id, None)
+                self.player_tracker.tracking_data["player"].pop(frame_id, None)
+                self.player_tracker.tracking_data["interpolated_frames"].clear()
+                self.action_predictor.action_data["action"].pop(frame_id, None)
+
+                end_time = time.monotonic()
+                policy.update(end_time - start_time)
+                metrics.num_processed += 1
+                metrics.latencies.append(end_time - capture_time)
+                emitter.emit({"frame_id": frame_id, "latency": round(end_time - capture_time, 4),
+                              "ball": ball_info, "player": player_info, "action": action_info})
+                if aggregator is not None:
+                    for event in aggregator.update(frame_id, player_info, action_info):
+                        emitter.emit({"action_event": event})
+                    aggregator.events.clear()  # emitted events are not kept for the whole stream
+                if heatmap is not None:
+                    heatmap.update(frame_id, ball_info, player_info)
+
+                if end_time - last_metrics_time >= metrics_interval:
+                    emitter.emit({"metrics": metrics.snapshot(reader)})
+                    last_metrics_time = end_time
+        finally:
+            reader.release()
+            if aggregator is not None:
+                # events still open when the stream ends
+                for track_id in list(aggregator.open_events):
+                    emitter.emit({"action_event": aggregator.close(track_id)})
+            summary = metrics.snapshot(reader)
+            emitter.emit({"metrics": summary})
+            emitter.close()
+            if heatmap is not None:
+                heatmap.save(self.config.get("heatmap_dir", "outputs/heatmaps"))
+        return summary
+
+    def run_single_pass(self, show=False, save=False):
+        """Decode the video once and feed every frame to all models, optionally drawing in the same pass."""
+        reader = open_frame_reader(self.config["video_path"], self.queue_size)
+        for tracker in self.stage_trackers().values():
+            tracker.set_frame_size(reader.frame_width, reader.frame_height)
+
+        trail_history = self.renderer.new_trail()  # store ball positions for trail
+        stop_requested = []  # set by the renderer when the user quits the preview
+        out, output_video_path = None, None
+        if save:
+            output_video_path = os.path.join(self.config["output_dir"], "output_visualized.mp4")
+            os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
+            out = self.create_writer(output_video_path, reader)
+
+        def render(item):
+            # draw and encode one frame; runs on the writer thread when pipelined
+            with self.profiler.stage("visualize", "draw"):
+                frame = self.draw_frame(*item, trail_history)
+            if save:
+                with self.profiler.stage("visualize", "encode"):
+                    out.write(frame)
+            if show:
+                cv2.imshow('Volleyball Visualization', cv2.resize(frame, (1200, 780)))
+                if cv2.waitKey(7) & 0xFF == ord('q'):
+                    stop_requested.append(True)
+
+        # the preview window has to be driven from the main thread
+        writer = OrderedWriter(render, 0 if show else self.queue_size)
+        stages = self.stage_executor(reader)
+        worker_data = None
+
+        def handle(finished, pbar):
+            # results of all stages for one batch, joined per frame
+            done_ids, done_frames, results = finished
+            if show or save:
+                for item in zip(done_frames, results["ball"], results["player"], results["action"]):
+                    writer.put(item)
+                self.profiler.record_queue_depth("visualize.render", writer.depth())
+            pbar.update(len(done_ids))
+
+        try:
+            with stages, writer, \
+                    tqdm(total=reader.num_frames, desc='Single pass | Processing video...', colour='cyan') as pbar:
+                for frame_ids, frames in batched(self.profiler.timed_frames(reader, "pipeline"), self.batch_size):
+                    for finished in stages.submit(frame_ids, frames):
+                        handle(finished, pbar)
+                    if stop_requested:
+                        break
+                for finished in stages.drain():
+                    handle(finished, pbar)
+                worker_data = stages.finish()
+        finally:
+            reader.release()
+            if save:
+                out.release()
+            if show:
+                cv2.destroyAllWindows()
+
+        if save:
+            print(f"Video saved to {output_video_path}")
+
+        # results of stages that ran in their own processes
+        for stage, data in (worker_data or {}).items():
+            stage_data(stage, self.stage_trackers()[stage]).update(data)
+
+        self.ball_tracker.save_data()
+        self.player_tracker.save_data()
+        self.action_predictor.save_data()
+        data = self.ball_tracker.tracking_data, self.player_tracker.tracking_data, self.action_predictor.action_data
+        self.finish_stages(*data)
+        return data
+
+    def stage_trackers(self):
+        return {"ball": self.ball_tracker, "player": self.player_tracker, "action": self.action_predictor}
+
+    def stage_executor(self, reader):
+        # how the single pass runs the three stages on each batch: inline, one thread per stage,
+        # or one process per stage pinned to its own cores (concurrent_stages)
+        executor = stage_executor(self.config.get("concurrent_stages", "off"), self.config, self.stage_trackers(),
+                                  reader.frame_width, reader.frame_height, self.batch_size, max(1, self.queue_size))
+        executor.profiler = self.profiler
+        return executor
+
+    def draw_frame(self, frame, ball_info, players, actions, trail):
+        # draw one frame of ball, players and actions; trail comes from self.renderer.new_trail()
+        return self.renderer.draw(frame, ball_info, players, actions, trail)
 
     def visualize(self, ball_data, player_data, action_data, show=False, save=False):
         # visualize ball, players, and actions on video
-        cap = cv2.VideoCapture(self.config["video_path"])
-        frame_id = 0
-        trail_history = []  # store ball positions for trail
-        max_trail_length = 10
+        reader = open_frame_reader(self.config["video_path"], self.queue_size)
+        trail_history = self.renderer.new_trail()  # store ball positions for trail
 
         # setup video writer
         output_video_path = os.path.join(self.config["output_dir"], "output_visualized.mp4")
+        out = None
         if save:
             os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            out = cv2.VideoWriter(output_video_path, fourcc, fps, (frame_width, frame_height))
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # create overlay for drawing
-            overlay = frame.copy()
-            frame_id_str = str(frame_id)
-
-            # draw ball with comet trail
-            if frame_id_str in ball_data["ball"] and ball_data["ball"][frame_id_str]["center"]:
-                ball_info = ball_data["ball"][frame_id_str]
-                xc, yc = map(int, ball_info["center"])
-                trail_history.append((xc, yc))
-                if len(trail_history) > max_trail_length:
-                    trail_history.pop(0)
-
-                for i in range(len(trail_history) - 1):
-                    alpha = (i + 1) / len(trail_history)
-                    color = (0, int(165 * alpha), int(255 * alpha))  # orange gradient
-                    thickness = max(1, int(5 * alpha))
-                    cv2.line(overlay, trail_history[i], trail_history[i + 1], color, thickness)
-
-                cv2.circle(overlay, (xc, yc), 8, (0, 165, 255), -1)  # orange glow
-                cv2.circle(overlay, (xc, yc), 10, (255, 255, 255), 2)  # white outline
-
-            # draw players with ellipse and action
-            if frame_id_str in player_data["player"]:
-                players = player_data["player"][frame_id_str]
-                for track_id, info in players.items():
-                    bbox = info["bbox"]
-                    x_min, y_min, x_max, y_max = map(int, bbox)
-                    center_x = (x_min + x_max) // 2
-                    feet_y = y_max - 10
-
-                    # print track id for player
-                    # cv2.putText(overlay, f'ID: {track_id}', (x_min, y_min-5), fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                    #             color=(0, 255, 0), fontScale=1, thickness=3)
-
-                    # draw ellipse at feet
-                    axes = (int((x_max - x_min) * 0.4), int((x_max - x_min) * 0.2))
-                    cv2.ellipse(overlay, (center_x, feet_y), axes, 5, -10, 224, (148, 0, 211), 8)
-
-            # draw action boxes and classes
-            # action class colors (BGR format)
-            action_class_colors = [
-                (0, 255, 255),  # yellow for "block"
-                (0, 255, 0),  # green for "defense"
-                (255, 255, 0),  # cyan for "serve"
-                (255, 165, 0),  # orange for "set"
-                (0, 0, 255)  # red for "spike"
-            ]
-            if frame_id_str in action_data['action']:
-                actions = action_data['action'][frame_id_str]
-                if "bbox" in actions and "class" in actions:
-                    action_boxes = actions["bbox"]
-                    action_classes = actions["class"]
-                    for box, cls in zip(action_boxes, action_classes):
-                        x_min, y_min, x_max, y_max = map(int, box)
-                        cls_idx = int(cls) % len(action_class_colors)  # ensure index is valid
-                        color = action_class_colors[cls_idx]
-                        action_text = self.config["action_classes"][cls_idx]
-
-                        # draw gradient bounding box
-                        cv2.rectangle(overlay, (x_min, y_min), (x_max, y_max), color, 5)
-                        cv2.rectangle(overlay, (x_min + 2, y_min + 2), (x_max - 2, y_max - 2),
-                                      (int(color[0] * 0.7), int(color[1] * 0.7), int(color[2] * 0.7)), 2)
-
-                        # draw action label with shadow and background
-                        text_pos = (x_min, y_min - 10)
-                        text_size, _ = cv2.getTextSize(action_text, cv2.FONT_HERSHEY_SIMPLEX, 2, 2)
-                        bg_x_min, bg_y_min = text_pos[0] - 5, text_pos[1] - text_size[1] - 5
-                        bg_x_max, bg_y_max = text_pos[0] + text_size[0] + 5, text_pos[1] + 5
-                        cv2.rectangle(overlay, (bg_x_min, bg_y_min), (bg_x_max, bg_y_max),
-                                      (50, 50, 50, 150), -1)  # semi-transparent gray background
-                        cv2.putText(overlay, action_text, (text_pos[0] + 2, text_pos[1] + 2),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3)  # black shadow
-                        cv2.putText(overlay, action_text, text_pos,
-                                    cv2.FONT_HERSHEY_SIMPLEX, 2, color, 2)  # colored text
-
-            # blend overlay with frame
-            alpha = 0.5  # 50% transparency
-            frame = cv2.addWeighted(frame, 1 - alpha, overlay, alpha, 0)
-
-            # write frame if save is True
-            if save:
-                out.write(frame)
+            out = self.create_writer(output_video_path, reader)
 
-            # display frame
-            if show:
-                cv2.imshow('Volleyball Visualization', cv2.resize(frame, (1200, 780)))
-                if cv2.waitKey(7) & 0xFF == ord('q'):
-                    break
-            frame_id += 1
+        # encode on a separate thread so it overlaps with drawing the next frame
+        try:
+            encode = self.profiler.timed(out.write, "visualize", "encode") if save else None
+            with OrderedWriter(encode, self.queue_size) as writer:
+                for frame_id, frame in self.profiler.timed_frames(reader, "visualize"):
+                    with self.profiler.stage("visualize", "draw"):
+                        frame = self.draw_frame(frame,
+                                                frame_entry(ball_data, "ball", frame_id),
+                                                frame_entry(player_data, "player", frame_id),
+                                                frame_entry(action_data, "action", frame_id),
+                                                trail_history)
+
+                    # write frame if save is True
+                    if save:
+                        writer.put(frame)
+                        self.profiler.record_queue_depth("visualize.encode", writer.depth())
+
+                    # display frame
+                    if show:
+                        cv2.imshow('Volleyball Visualization', cv2.resize(frame, (1200, 780)))
+                        if cv2.waitKey(7) & 0xFF == ord('q'):
+                            break
+        finally:
+            reader.release()
+            if save:
+                out.release()
 
-        cap.release()
         if save:
-            out.release()
             print(f"Video saved to {output_video_path}")
 
-        cv2.destroyAllWindows()
\ No newline at end of file
+        # headless OpenCV builds have no window functions
+        if show:
+            cv2.destroyAllWindows()
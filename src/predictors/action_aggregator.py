@@ -0,0 +1,94 @@
+from collections import Counter, deque
+import numpy as np
+from src.utils.img_utils import box_iou
+
+# constants for easy configuration
+DEFAULT_VOTE_WINDOW = 5  # frames of action observations voted over per track
+DEFAULT_IOU_THRESHOLD = 0.3  # minimum IoU between an action box and a player box to assign the action
+
+
+def match_actions(players, actions, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    # track_id -> action class for one frame; every action box goes to the player box it overlaps most,
+    # one action per player, strongest overlap first
+    if not players or not actions or not actions.get("bbox"):
+        return {}
+    track_ids = list(players)
+    ious = box_iou(actions["bbox"], [players[track_id]["bbox"] for track_id in track_ids])
+
+    matched = {}
+    order = np.argsort(-ious, axis=None)
+    for action_index, player_index in zip(*np.unravel_index(order, ious.shape)):
+        if ious[action_index, player_index] < iou_threshold:
+            break
+        track_id = int(track_ids[player_index])
+        if track_id not in matched:
+            matched[track_id] = int(actions["class"][action_index])
+    return matched
+
+
+class ActionAggregator:
+    # turns per-frame action detections into (track_id, class, start_frame, end_frame) events by matching
+    # them to player tracks and majority-voting each track's class over a sliding window
+    def __init__(self, action_classes, window=DEFAULT_VOTE_WINDOW, iou_threshold=DEFAULT_IOU_THRESHOLD,
+                 min_votes=None):
+        self.action_classes = action_classes
+        self.window = window
+        self.iou_threshold = iou_threshold
+        self.min_votes = min_votes or window // 2 + 1  # observations of a class in the window to accept it
+        self.observations = {}  # track_id -> deque of (frame_id, class or None)
+        self.open_events = {}  # track_id -> event still being extended
+        self.events = []  # closed events
+
+    def vote(self, track_id):
+        # majority class over the track's window, None below min_votes; ties keep the current event's class
+        counts = Counter(cls for _, cls in self.observations[track_id] if cls is not None)
+        if not counts:
+            return None
+        current = self.open_events.get(track_id)
+        cls, votes = max(counts.items(),
+                         key=lambda item: (item[1], current is not None and item[0] == current["class"]))
+        return cls if votes >= self.min_votes else None
+
+    def update(self, frame_id, players, actions):
+        """Add one frame of player tracks and action detections; returns the events that ended before it."""
+        matched = match_actions(players or {}, actions or {}, self.iou_threshold)
+        closed = []
+        for track_id in set(int(track_id) for track_id in players or {}) | set(self.observations):
+            observations = self.observations.setdefault(track_id, deque(maxlen=self.window))
+            observations.append((frame_id, matched.get(track_id)))
+            voted = self.vote(track_id)
+
+            event = self.open_events.get(track_id)
+            if event is not None and event["class"] != voted:
+                closed.append(self.close(track_id))
+                event = None
+            if voted is not None:
+                if event is None:
+                    # the event starts at the first frame of the window that shows the class
+                    start = min(observed_id for observed_id, cls in observations if cls == voted)
+                    event = self.open_events[track_id] = {"track_id": track_id, "class": voted,
+                                                          "label": self.label(voted), "start_frame": start,
+                                                          "end_frame": start}
+                if matched.get(track_id) == voted:
+                    event["end_frame"] = frame_id
+
+            # forget tracks with nothing left to vote on
+            if event is None and all(cls is None for _, cls in observations):
+                del self.observations[track_id]
+        return closed
+
+    def label(self, cls):
+        if self.action_classes and 0 <= cls < len(self.action_classes):
+            return self.action_classes[cls]
+        return str(cls)
+
+    def close(self, track_id):
+        event = self.open_events.pop(track_id)
+        self.events.append(event)
+        return event
+
+    def finish(self):
+        """Close the remaining events and return all events ordered by start frame."""
+        for track_id in list(self.open_events):
+            self.close(track_id)
+        return sorted(self.events, key=lambda event: (event["start_frame"], event["track_id"]))
@@ -1,91 +1,169 @@
-import cv2
-import numpy as np
 import os
-import json
+import numpy as np
 from tqdm import tqdm
-from ultralytics import YOLO
-from src.utils.io import save_json_data
-from src.utils.img_utils import load_mask, foot_pos
+from src.utils.io import save_tracking_data, load_tracking_data
+from src.utils.img_utils import load_court_mask
+from src.utils.cache import file_digest
+from src.utils.backends import LazyModel
+from src.utils.profiler import NULL_PROFILER
+from src.utils.video import open_frame_reader, batched
+from src.utils.stride import FrameStride, DEFAULT_MOTION_THRESHOLD
 
 # constants for easy configuration
-DEFAULT_FRAME_WINDOW = 5  # number of frames to consider for action prediction
+DEFAULT_FRAME_WINDOW = 5  # frames an inferred action label is held for when frames are skipped
+DEFAULT_BATCH_SIZE = 1  # number of frames per model call
+DEFAULT_IMGSZ = 640  # model input size
+DEFAULT_CONF = 0.25  # minimum detection confidence (the ultralytics default)
 
 
 class ActionPredictor:
     def __init__(self, model_path, video_path,
-                 frame_window=DEFAULT_FRAME_WINDOW, action_classes=None, mask_path=None):
-        # load action prediction model and set basic attributes
-        self.model = YOLO(model_path) # placeholder for model loading
-        self.mask = load_mask(mask_path)
+                 frame_window=DEFAULT_FRAME_WINDOW, action_classes=None, mask_path=None,
+                 batch_size=DEFAULT_BATCH_SIZE, queue_size=0, output_format="json",
+                 stride=1, adaptive_stride=False, motion_threshold=DEFAULT_MOTION_THRESHOLD,
+                 backend_options=None, device=None):
+        # action prediction model (on the configured inference backend) and basic attributes
+        self.backend_options = backend_options or {}
+        self.model = LazyModel(model_path, **self.backend_options)  # loaded on first use
+        self.device = device  # e.g. "cuda:0" or "cpu", None lets ultralytics pick
+        self.model_path = model_path
+        self.court_mask = load_court_mask(mask_path)
+        self.mask_path = mask_path
         self.video_path = video_path
         self.output_dir = "outputs/action_data"
         self.action_data = {'action': {}}  # store action predictions
         self.frame_window = frame_window  # window size for action context
         self.action_classes = action_classes  # list of possible actions
-        self.frame_width = 640
+        self.frame_width = DEFAULT_IMGSZ  # model input size
+        self.conf = DEFAULT_CONF
+        self.batch_size = batch_size  # number of frames per model call
+        self.queue_size = queue_size  # decoded frames buffered ahead of inference, 0 decodes inline
+        self.output_format = output_format  # "json", "columnar" or "both"
+        self.profiler = NULL_PROFILER  # replaced by a Profiler to record step timings
+        self.frame_stride = FrameStride(stride, adaptive_stride, motion_threshold)  # frames skipped between inferences
+        self.last_inferred = None  # (frame_id, actions) of the last frame the model ran on
+        self.save_frames = True  # False when only aggregated action events are kept
 
         # create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def process_video(self, read_from_json=True, json_path=None):
-        # load tracking data from JSON if specified
-        if read_from_json and json_path is not None and os.path.isfile(json_path):
-            with open(json_path, 'r') as f:
-                return json.load(f)
-
-        # open video file
-        cap = cv2.VideoCapture(self.video_path)
-        frame_id = 0
-        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        # process each frame with progress bar
-        with tqdm(total=num_frames, desc='Action | Processing video...', colour='cyan') as pg_barr:
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                # detect and track players in current frame
-                action_info = self.predictor(frame, self.frame_width)
-                self.action_data["action"][frame_id] = action_info
-
-                frame_id += 1
-                pg_barr.update(1)
-
-        cap.release()
-
+    def cache_params(self):
+        # everything besides the video that changes this stage's results
+        return {"stage": "action", "model": file_digest(self.model_path), "mask": file_digest(self.mask_path),
+                "mask_shape": self.court_mask.mask.shape, "imgsz": self.frame_width,
+                "conf": self.conf, "frame_window": self.frame_window,
+                "backend": self.backend_options.get("backend", "torch"),
+                "precision": self.backend_options.get("precision", "fp32"), **self.frame_stride.params()}
+
+    def predict_options(self):
+        # input size and confidence the model runs at, e.g. for checking an exported backend against them
+        return {"imgsz": self.frame_width, "conf": self.conf}
+
+    def get_state(self):
+        # predictions are independent per frame
+        return None
+
+    def set_state(self, state):
+        # the next frame is inferred again
+        self.frame_stride.reset()
+        self.last_inferred = None
+
+    def set_frame_size(self, frame_width, frame_height):
+        # actions are predicted at a fixed input size, whatever the video size
+        pass
+
+    def set_video(self, video_path, output_dir=None):
+        # start on another video with the loaded model, e.g. the next job of a batch
+        self.video_path = video_path
+        self.action_data = {'action': {}}
+        self.set_state(None)
+        if output_dir is not None:
+            self.output_dir = output_dir
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def process_frame(self, frame_id, frame):
+        # predict actions in a single decoded frame
+        action_info = self.predictor(frame, self.frame_width)
+        self.action_data["action"][frame_id] = action_info
+        return action_info
+
+    def process_batch(self, frame_ids, frames):
+        # predict actions in a batch of decoded frames; with a stride only the selected frames are inferred
+        # and the rest hold the last inferred labels for up to frame_window frames
+        selected = self.frame_stride.select(frame_ids, frames)
+        inferred = [(frame_id, frame) for frame_id, frame, infer in zip(frame_ids, frames, selected) if infer]
+        predictions = dict(zip([frame_id for frame_id, _ in inferred],
+                               self.predict_batch([frame for _, frame in inferred], self.frame_width)
+                               if inferred else []))
+
+        action_infos = []
+        for frame_id in frame_ids:
+            if frame_id in predictions:
+                action_info = predictions[frame_id]
+                self.last_inferred = (frame_id, action_info)
+            elif self.last_inferred and frame_id - self.last_inferred[0] < self.frame_window:
+                action_info = {**self.last_inferred[1], "interpolated": True}
+            else:
+                action_info = {"bbox": [], "class": [], "interpolated": True}
+            self.action_data["action"][frame_id] = action_info
+            action_infos.append(action_info)
+        return action_infos
+
+    def save_data(self):
         # save tracking data to file
+        if not self.save_frames:
+            return
         output_path = os.path.join(self.output_dir, 'action.json')
+        with self.profiler.stage("action", "serialize", len(self.action_data["action"])):
+            save_tracking_data(self.action_data, output_path, self.output_format)
+
+    def process_video(self, read_from_json=True, json_path=None):
+        # load saved tracking data (columnar store or JSON) if specified
+        if read_from_json:
+            saved_data = load_tracking_data(json_path)
+            if saved_data is not None:
+                return saved_data
 
-        save_json_data(self.action_data, output_path)
+        # open video file
+        with open_frame_reader(self.video_path, self.queue_size) as reader:
+            # process each frame with progress bar
+            with tqdm(total=reader.num_frames, desc='Action | Processing video...', colour='cyan') as pg_barr:
+                for frame_ids, frames in batched(self.profiler.timed_frames(reader, "action"), self.batch_size):
+                    self.process_batch(frame_ids, frames)
+                    pg_barr.update(len(frame_ids))
+
+        self.save_data()
         return self.action_data
 
     def predictor(self, frame, frame_width):
-        # detect and track players using YOLO with ByteTrack
-        result = self.model(source=frame, imgsz=frame_width, verbose=False)[0]
-
-        # store tracking info for each player
-        boxes_list, classes_list = [], []
+        # predict actions in one frame
+        return self.predict_batch([frame], frame_width)[0]
+
+    def predict_batch(self, frames, frame_width):
+        # predict actions in a batch of frames with one YOLO call
+        results = self.model.predict(source=list(frames), imgsz=frame_width, conf=self.conf, device=self.device,
+                                     verbose=False)
+        self.profiler.record_results("action", results)
+        with self.profiler.stage("action", "postprocess", len(results)):
+            return [self.parse_result(result) for result in results]
+
+    def parse_result(self, result):
+        # store action boxes whose feet are on the court
+        boxes_list, classes_list, confs_list = [], [], []
         if result.boxes is not None:
-            boxes = result.boxes.xyxy.cpu().numpy()
+            boxes = result.boxes.xyxy.cpu().numpy().astype(np.float64)
             classes = result.boxes.cls.cpu().numpy()
+            confs = result.boxes.conf.cpu().numpy()
 
-            for i, (bbox, cls) in enumerate(zip(boxes, classes)):
-                bbox = bbox.tolist()
-
-                # foot position
-                foot_pos_x, foot_pos_y = foot_pos(bbox)
-                if self.mask[int(foot_pos_y-1), int(foot_pos_x-1)] == 0:
-                    continue
-
-                cls = cls.tolist()
-                center = [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2]
-                boxes_list.append(bbox)
-                classes_list.append(cls)
+            keep = self.court_mask.keep(boxes)
+            boxes_list = boxes[keep].tolist()
+            classes_list = classes[keep].tolist()
+            confs_list = confs[keep].tolist()
 
         action_info = {
             "bbox": boxes_list,
-            "class": classes_list
+            "class": classes_list,
+            "conf": confs_list
         }
 
-        return action_info
\ No newline at end of file
+        return action_info
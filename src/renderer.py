@@ -0,0 +1,158 @@
+from collections import deque
+import cv2
+import numpy as np
+
+# action class colors (BGR format)
+ACTION_CLASS_COLORS = [
+    (0, 255, 255),  # yellow for "block"
+    (0, 255, 0),  # green for "defense"
+    (255, 255, 0),  # cyan for "serve"
+    (255, 165, 0),  # orange for "set"
+    (0, 0, 255)  # red for "spike"
+]
+DEFAULT_TRAIL_LENGTH = 10
+DEFAULT_ALPHA = 0.5  # 50% transparency of the drawings
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 2
+
+
+def merge_rects(rects):
+    # merge overlapping (x1, y1, x2, y2) rects until they are disjoint, so no pixel is blended twice
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+class Renderer:
+    # draws ball trail, player ellipses and action labels, blending only the regions that were drawn on
+    def __init__(self, action_classes, max_trail_length=DEFAULT_TRAIL_LENGTH, alpha=DEFAULT_ALPHA):
+        self.action_classes = action_classes
+        self.max_trail_length = max_trail_length
+        self.alpha = alpha
+        self.label_sprites = {}  # class index -> (sprite, mask, x offset, y offset above the box)
+
+    def new_trail(self):
+        # ring buffer of recent ball positions
+        return deque(maxlen=self.max_trail_length)
+
+    def label_sprite(self, cls_idx):
+        # label with shadow and background, rendered once per class
+        if cls_idx not in self.label_sprites:
+            text = self.action_classes[cls_idx]
+            color = ACTION_CLASS_COLORS[cls_idx]
+            (text_w, text_h), baseline = cv2.getTextSize(text, LABEL_FONT, LABEL_SCALE, 2)
+            pad = 5
+            height, width = text_h + baseline + 2 * pad + 3, text_w + 2 * pad + 3
+            sprite = np.zeros((height, width, 3), dtype=np.uint8)
+            mask = np.zeros((height, width), dtype=np.uint8)
+
+            # background box and text in sprite coordinates; the text baseline sits pad + text_h from the top
+            origin = (pad, pad + text_h)
+            for image, value in ((sprite, (50, 50, 50)), (mask, 255)):
+                cv2.rectangle(image, (0, 0), (text_w + 2 * pad, text_h + 2 * pad), value, -1)
+            for image, values in ((sprite, ((0, 0, 0), color)), (mask, (255, 255))):
+                cv2.putText(image, text, (origin[0] + 2, origin[1] + 2), LABEL_FONT, LABEL_SCALE, values[0], 3)
+                cv2.putText(image, text, origin, LABEL_FONT, LABEL_SCALE, values[1], 2)
+
+            # offsets from the box's top-left corner, matching a label drawn at (x_min, y_min - 10)
+            self.label_sprites[cls_idx] = (sprite, mask > 0, -pad, -10 - text_h - pad)
+        return self.label_sprites[cls_idx]
+
+    def draw(self, frame, ball_info, players, actions, trail):
+        """Draw one frame in place; trail is the deque returned by new_trail and is updated here."""
+        frame_h, frame_w = frame.shape[:2]
+        shapes = []  # (draw function, rect)
+
+        # ball with comet trail
+        if ball_info and ball_info["center"]:
+            xc, yc = map(int, ball_info["center"])
+            trail.append((xc, yc))
+            points = list(trail)
+            for i in range(len(points) - 1):
+                alpha = (i + 1) / len(points)
+                color = (0, int(165 * alpha), int(255 * alpha))  # orange gradient
+                thickness = max(1, int(5 * alpha))
+                (x1, y1), (x2, y2) = points[i], points[i + 1]
+                shapes.append((lambda img, p=points[i], q=points[i + 1], c=color, t=thickness:
+                               cv2.line(img, p, q, c, t),
+                               (min(x1, x2) - thickness, min(y1, y2) - thickness,
+                                max(x1, x2) + thickness + 1, max(y1, y2) + thickness + 1)))
+
+            def draw_ball(img, center=(xc, yc)):
+                cv2.circle(img, center, 8, (0, 165, 255), -1)  # orange glow
+                cv2.circle(img, center, 10, (255, 255, 255), 2)  # white outline
+            shapes.append((draw_ball, (xc - 12, yc - 12, xc + 13, yc + 13)))
+
+        # players with ellipse at feet
+        if players:
+            for track_id, info in players.items():
+                x_min, y_min, x_max, y_max = map(int, info["bbox"])
+                center = ((x_min + x_max) // 2, y_max - 10)
+                axes = (int((x_max - x_min) * 0.4), int((x_max - x_min) * 0.2))
+                points = cv2.ellipse2Poly(center, axes, 5, -10, 224, 5)
+                x, y, w, h = cv2.boundingRect(points)
+                shapes.append((lambda img, c=center, a=axes: cv2.ellipse(img, c, a, 5, -10, 224, (148, 0, 211), 8),
+                               (x - 5, y - 5, x + w + 5, y + h + 5)))
+
+        # action boxes and labels
+        if actions and "bbox" in actions and "class" in actions:
+            for box, cls in zip(actions["bbox"], actions["class"]):
+                x_min, y_min, x_max, y_max = map(int, box)
+                cls_idx = int(cls) % len(ACTION_CLASS_COLORS)  # ensure index is valid
+                color = ACTION_CLASS_COLORS[cls_idx]
+
+                def draw_box(img, p=(x_min, y_min), q=(x_max, y_max), c=color):
+                    # gradient bounding box
+                    cv2.rectangle(img, p, q, c, 5)
+                    cv2.rectangle(img, (p[0] + 2, p[1] + 2), (q[0] - 2, q[1] - 2),
+                                  (int(c[0] * 0.7), int(c[1] * 0.7), int(c[2] * 0.7)), 2)
+                shapes.append((draw_box, (x_min - 3, y_min - 3, x_max + 4, y_max + 4)))
+
+                sprite, mask, dx, dy = self.label_sprite(cls_idx)
+                x, y = x_min + dx, y_min + dy
+                shapes.append((lambda img, s=sprite, m=mask, x=x, y=y: paste_sprite(img, s, m, x, y),
+                               (x, y, x + sprite.shape[1], y + sprite.shape[0])))
+
+        # regions that will change, clipped to the frame
+        regions = []
+        for _, (x1, y1, x2, y2) in shapes:
+            x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, frame_w), min(y2, frame_h)
+            if x1 < x2 and y1 < y2:
+                regions.append((x1, y1, x2, y2))
+        regions = merge_rects(regions)
+        originals = [frame[y1:y2, x1:x2].copy() for x1, y1, x2, y2 in regions]
+
+        for draw_shape, _ in shapes:
+            draw_shape(frame)
+
+        # blend drawings with the untouched pixels only where something was drawn
+        for (x1, y1, x2, y2), original in zip(regions, originals):
+            region = frame[y1:y2, x1:x2]
+            region[:] = cv2.addWeighted(original, 1 - self.alpha, region, self.alpha, 0)
+        return frame
+
+
+def paste_sprite(image, sprite, mask, x, y):
+    # copy the masked sprite pixels to (x, y), clipped to the image
+    image_h, image_w = image.shape[:2]
+    sprite_h, sprite_w = sprite.shape[:2]
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + sprite_w, image_w), min(y + sprite_h, image_h)
+    if x1 >= x2 or y1 >= y2:
+        return
+    sprite_region = (slice(y1 - y, y2 - y), slice(x1 - x, x2 - x))
+    region = image[y1:y2, x1:x2]
+    region_mask = mask[sprite_region]
+    region[region_mask] = sprite[sprite_region][region_mask]
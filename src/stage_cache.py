@@ -0,0 +1,113 @@
+from src.parallel import stage_results, interpolated_frames, reconcile_track_ids, remap_track_ids
+from src.utils.cache import ResultCache, DEFAULT_SEGMENT_SIZE, DEFAULT_MAX_CACHE_SIZE, file_digest, hash_key, segment_digests
+from src.utils.video import FrameReader, get_video_info, batched
+from tqdm import tqdm
+
+# constants for easy configuration
+DEFAULT_RESUME_OVERLAP = 30  # frames re-tracked before a resume point to match player ids
+
+
+class StageCache:
+    # runs a stage over a video, reusing cached per-segment results and only processing segments that changed
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_CACHE_SIZE, segment_size=DEFAULT_SEGMENT_SIZE,
+                 resume_overlap=DEFAULT_RESUME_OVERLAP):
+        self.cache = ResultCache(cache_dir, max_size)
+        self.segment_size = segment_size
+        self.resume_overlap = min(resume_overlap, segment_size - 1)
+
+    def video_segments(self, video_path):
+        # segment digests are cached by file content, so unchanged videos are not demuxed again
+        digests_key = hash_key("segments", file_digest(video_path), self.segment_size)
+        digests = self.cache.get(digests_key)
+        if digests is None:
+            digests = segment_digests(video_path, self.segment_size)
+            self.cache.put(digests_key, digests)
+        return digests
+
+    def process(self, stage, tracker, video_path):
+        """Return the stage's per-frame results for the video, processing only segments missing from the cache;
+        the tracker's interpolated frames cover the whole video afterwards."""
+        info = get_video_info(video_path)
+        tracker.set_frame_size(info["width"], info["height"])
+
+        stage_key = hash_key(tracker.cache_params())
+        segment_keys = [hash_key("segment", stage_key, digest) for digest in self.video_segments(video_path)]
+        entries = [self.cache.get(key) for key in segment_keys]
+
+        results, interpolated = {}, []
+        segment = 0
+        while segment < len(entries):
+            if entries[segment] is not None:
+                results.update(entries[segment]["results"])
+                interpolated.extend(entries[segment].get("interpolated", []))
+                segment += 1
+                continue
+
+            # process the run of consecutive misses in one pass
+            run_end = segment
+            while run_end < len(entries) and entries[run_end] is None:
+                run_end += 1
+            self.process_run(stage, tracker, video_path, segment, run_end, entries, segment_keys, results, interpolated)
+            segment = run_end
+
+        tracker_interpolated = interpolated_frames(stage, tracker)
+        tracker_interpolated[:] = interpolated
+        return results
+
+    def process_run(self, stage, tracker, video_path, first, last, entries, segment_keys, results, interpolated):
+        # process segments [first, last) and store one cache entry per segment
+        start = first * self.segment_size
+        end = None if last == len(entries) else last * self.segment_size
+
+        # restore sequential state from the end of the previous segment
+        tracker.set_state(entries[first - 1]["state"] if first > 0 else None)
+        frames = stage_results(stage, tracker)
+        frames.clear()
+        skipped = interpolated_frames(stage, tracker)
+        skipped.clear()
+
+        # player ids restart after a reset, so re-track a few frames the cache already covers and match them
+        reconcile = stage == "player" and first > 0
+        read_start = start - self.resume_overlap if reconcile else start
+        mapping = None
+        next_free_id = 1
+        if reconcile:
+            next_free_id = max((track_id for players in results.values() for track_id in players), default=0) + 1
+
+        def flush():
+            # move finished frames into a cache entry
+            nonlocal next_free_id
+            segment_results = {}
+            for frame_id in sorted(frames):
+                info = frames[frame_id]
+                if mapping is not None:
+                    info, next_free_id = remap_track_ids(info, mapping, next_free_id)
+                segment_results[frame_id] = info
+            frames.clear()
+            segment_interpolated = [frame_id for frame_id in skipped if frame_id in segment_results]
+            skipped.clear()
+
+            segment = min(segment_results) // self.segment_size
+            entries[segment] = {"results": segment_results, "state": tracker.get_state(),
+                                "interpolated": segment_interpolated}
+            self.cache.put(segment_keys[segment], entries[segment])
+            results.update(segment_results)
+            interpolated.extend(segment_interpolated)
+
+        with FrameReader(video_path, read_start, end) as reader, \
+                tqdm(total=reader.num_frames, desc=f'{stage} | Processing uncached segments...', colour='cyan') as pbar:
+            for frame_ids, batch in batched(reader, tracker.batch_size, self.segment_size):
+                tracker.process_batch(frame_ids, batch)
+                pbar.update(len(frame_ids))
+                next_frame = frame_ids[-1] + 1
+
+                if reconcile and next_frame == start:
+                    overlap_ids = sorted(frames)
+                    mapping, next_free_id = reconcile_track_ids(results, dict(frames), overlap_ids, next_free_id)
+                    frames.clear()
+                    skipped.clear()
+                elif next_frame % self.segment_size == 0 and frames:
+                    flush()
+
+            if frames:
+                flush()
@@ -0,0 +1,84 @@
+from src.parallel import stage_results, interpolated_frames, reconcile_track_ids, remap_track_ids
+from src.stage_cache import DEFAULT_RESUME_OVERLAP
+from src.utils.records import RecordWriter, RecordReader, load_checkpoint, DEFAULT_FLUSH_INTERVAL
+from src.utils.video import FrameReader, get_video_info, batched
+from tqdm import tqdm
+
+
+class StageRecorder:
+    # runs a stage over a video streaming each finished frame to an append-only records file instead of
+    # keeping the whole video in memory, and resumes from the file's last checkpoint after a crash
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL, resume_overlap=DEFAULT_RESUME_OVERLAP):
+        self.flush_interval = flush_interval
+        self.resume_overlap = resume_overlap
+
+    def process(self, stage, tracker, video_path, records_path):
+        """Return a lazy RecordReader over the stage's per-frame results, processing only frames after the checkpoint."""
+        checkpoint = load_checkpoint(records_path)
+        if checkpoint is not None and checkpoint["complete"]:
+            return RecordReader(records_path, stage)
+
+        info = get_video_info(video_path)
+        tracker.set_frame_size(info["width"], info["height"])
+
+        # continue after the last checkpointed frame with the state saved with it
+        if checkpoint is not None and checkpoint["frame_id"] is None:
+            checkpoint = None
+        start = checkpoint["frame_id"] + 1 if checkpoint else 0
+        tracker.set_state(checkpoint["state"] if checkpoint else None)
+        frames = stage_results(stage, tracker)
+        frames.clear()
+        interpolated_frames(stage, tracker).clear()
+
+        # player ids restart after a reset, so re-track a few frames already on disk and match them
+        mapping = None
+        next_free_id = checkpoint.get("next_free_id", 1) if checkpoint else 1
+        if stage == "player" and start > 0:
+            overlap_start = max(0, start - self.resume_overlap)
+            written = {frame_id: {int(track_id): player for track_id, player in players.items()}
+                       for frame_id, players in RecordReader(records_path, stage) if overlap_start <= frame_id < start}
+            with FrameReader(video_path, overlap_start, start) as reader:
+                for frame_ids, batch in batched(reader, tracker.batch_size):
+                    tracker.process_batch(frame_ids, batch)
+            overlap = {frame_id: players for frame_id, players in frames.items() if frame_id < start}
+            mapping, next_free_id = reconcile_track_ids(written, overlap, sorted(overlap), next_free_id)
+            frames.clear()
+            interpolated_frames(stage, tracker).clear()
+            tracker.pending = []
+
+        writer = RecordWriter(records_path, checkpoint, self.flush_interval)
+        with FrameReader(video_path, start) as reader, \
+                tqdm(total=max(reader.num_frames, 0), desc=f'{stage} | Recording results...', colour='cyan') as pbar:
+            for frame_ids, batch in batched(reader, tracker.batch_size):
+                tracker.process_batch(frame_ids, batch)
+                next_free_id = self.write_finished(stage, tracker, frames, writer, mapping, next_free_id)
+                pbar.update(len(frame_ids))
+                if writer.should_flush():
+                    writer.flush(tracker.get_state(), next_free_id=next_free_id)
+
+        # skipped frames still waiting for interpolation keep their held results
+        if hasattr(tracker, "pending"):
+            tracker.pending = []
+        next_free_id = self.write_finished(stage, tracker, frames, writer, mapping, next_free_id)
+        writer.close(tracker.get_state(), next_free_id=next_free_id)
+        return RecordReader(records_path, stage)
+
+    @staticmethod
+    def write_finished(stage, tracker, frames, writer, mapping, next_free_id):
+        # move finished frames from the stage's result dict to the records file, in frame order;
+        # frames a player stride may still interpolate stay in memory until the next inferred frame
+        pending = set(getattr(tracker, "pending", []))
+        skipped = interpolated_frames(stage, tracker)
+        interpolated = set(skipped)
+        for frame_id in sorted(frames):
+            if frame_id in pending:
+                break
+            info = frames.pop(frame_id)
+            if stage == "player":
+                if mapping is None:
+                    next_free_id = max([next_free_id] + [track_id + 1 for track_id in info])
+                else:
+                    info, next_free_id = remap_track_ids(info, mapping, next_free_id)
+            writer.write(frame_id, info, frame_id in interpolated)
+        skipped[:] = [frame_id for frame_id in skipped if frame_id in frames]
+        return next_free_id
@@ -0,0 +1,240 @@
+from src.parallel import build_stage, stage_data, spawn_context
+from src.utils.profiler import NULL_PROFILER
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+import numpy as np
+import os
+import time
+import traceback
+
+# constants for easy configuration
+CONCURRENCY_MODES = ("off", "threads", "processes")
+STAGES = ("ball", "player", "action")
+WORKER_POLL_INTERVAL = 1.0  # seconds between liveness checks while waiting on a stage process
+
+
+def available_cores():
+    # cores this process may run on
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def stage_core_sets(config, stages=STAGES):
+    # disjoint core set per stage process: stage_cores from the config, or the available cores split evenly;
+    # a stage without cores is not pinned
+    configured = config.get("stage_cores") or {}
+    if configured:
+        core_sets = {stage: sorted(set(configured.get(stage) or [])) or None for stage in stages}
+        assigned = [core for cores in core_sets.values() if cores for core in cores]
+        if len(assigned) != len(set(assigned)):
+            raise ValueError(f"stage_cores must not share cores between stages: {configured}")
+        return core_sets
+
+    cores = available_cores()
+    if len(cores) < len(stages):
+        return {stage: None for stage in stages}
+    return {stage: [int(core) for core in group] for stage, group in zip(stages, np.array_split(cores, len(stages)))}
+
+
+def pin_to_cores(cores):
+    # keep this process, and the torch / OpenCV thread pools it starts, on its own cores
+    if not cores:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    import cv2
+    import torch
+    torch.set_num_threads(len(cores))
+    cv2.setNumThreads(len(cores))
+
+
+class SerialStages:
+    # runs the stages of every batch one after the other in this process; the threads and processes variants
+    # keep the same interface: submit() yields finished batches, possibly of earlier submits, in frame order
+    def __init__(self, stages):
+        self.stages = stages  # stage name -> tracker or predictor
+        self.profiler = NULL_PROFILER
+
+    def submit(self, frame_ids, frames):
+        """Yield (frame_ids, frames, {stage: per-frame results}) for every batch finished in all stages."""
+        yield frame_ids, frames, {name: stage.process_batch(frame_ids, frames) for name, stage in self.stages.items()}
+
+    def drain(self):
+        # batches still in flight after the last submit
+        return iter(())
+
+    def finish(self):
+        # per-stage data kept outside this process, None when the trackers here hold them
+        return None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StageThreads(SerialStages):
+    # one thread per stage so models placed on different devices (or releasing the GIL during inference)
+    # run at the same time; each stage still sees its batches in order, up to depth batches run ahead of the join
+    def __init__(self, stages, depth=1):
+        super().__init__(stages)
+        self.depth = max(1, depth)
+        self.executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-stage")
+                          for name in stages}
+        self.in_flight = deque()
+
+    def submit(self, frame_ids, frames):
+        futures = {name: self.executors[name].submit(stage.process_batch, frame_ids, frames)
+                   for name, stage in self.stages.items()}
+        self.in_flight.append((frame_ids, frames, futures))
+        while len(self.in_flight) > self.depth:
+            yield self.join_oldest()
+
+    def join_oldest(self):
+        frame_ids, frames, futures = self.in_flight.popleft()
+        return frame_ids, frames, {name: future.result() for name, future in futures.items()}
+
+    def drain(self):
+        while self.in_flight:
+            yield self.join_oldest()
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _stage_worker(stage, config, cores, shm_name, slot_shape, inbox, outbox):
+    # one stage in its own process: frames are read from the shared slots, results are sent back per batch
+    shm, slots = None, None
+    try:
+        pin_to_cores(cores)
+        tracker = build_stage(stage, config)
+        tracker.model.load()  # before reporting ready, so a model that fails to load stops the run right away
+        frame_height, frame_width = slot_shape[2:4]
+        tracker.set_frame_size(frame_width, frame_height)
+
+        shm = SharedMemory(name=shm_name)
+        slots = np.ndarray(slot_shape, dtype=np.uint8, buffer=shm.buf)
+        outbox.put(("ready", None, None))
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            slot, frame_ids = item
+            start = time.perf_counter()
+            infos = tracker.process_batch(frame_ids, list(slots[slot, :len(frame_ids)]))
+            outbox.put(("batch", infos, time.perf_counter() - start))
+        outbox.put(("done", stage_data(stage, tracker), None))
+    except Exception:
+        outbox.put(("error", traceback.format_exc(), None))
+    finally:
+        del slots
+        if shm is not None:
+            shm.close()
+
+
+class StageProcesses(SerialStages):
+    # one spawned process per stage, each pinned to its own core set and loading its own model; decoded frames
+    # are copied once into shared-memory slots that every stage reads, and only the small results come back
+    def __init__(self, config, stages, frame_width, frame_height, batch_size=1, depth=1, core_sets=None):
+        super().__init__({name: None for name in stages})
+        self.depth = max(1, depth)
+        core_sets = core_sets or {}
+
+        # a slot is reused only after every stage returned its batch, so depth + 1 slots are enough
+        self.slot_shape = (self.depth + 1, batch_size, frame_height, frame_width, 3)
+        self.shm = SharedMemory(create=True, size=int(np.prod(self.slot_shape)))
+        self.slots = np.ndarray(self.slot_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.num_submitted = 0
+        self.in_flight = deque()
+
+        context = spawn_context()
+        self.inboxes, self.outboxes, self.processes = {}, {}, {}
+        try:
+            for name in stages:
+                self.inboxes[name], self.outboxes[name] = context.Queue(), context.Queue()
+                self.processes[name] = context.Process(
+                    target=_stage_worker, daemon=True,
+                    args=(name, config, core_sets.get(name), self.shm.name, self.slot_shape,
+                          self.inboxes[name], self.outboxes[name]))
+                self.processes[name].start()
+            for name in stages:
+                self.receive(name, "ready")
+        except BaseException:
+            self.close()
+            raise
+
+    def receive(self, name, expected):
+        # next message of a stage process, failing instead of waiting forever when the process died
+        while True:
+            try:
+                kind, payload, seconds = self.outboxes[name].get(timeout=WORKER_POLL_INTERVAL)
+            except Empty:
+                if not self.processes[name].is_alive():
+                    raise RuntimeError(f"{name} stage process exited with code {self.processes[name].exitcode}")
+                continue
+            if kind == "error":
+                raise RuntimeError(f"{name} stage process failed:\n{payload}")
+            if kind != expected:
+                raise RuntimeError(f"{name} stage process sent {kind}, expected {expected}")
+            return payload, seconds
+
+    def submit(self, frame_ids, frames):
+        slot = self.num_submitted % self.slot_shape[0]
+        self.num_submitted += 1
+        for i, frame in enumerate(frames):
+            self.slots[slot, i] = frame
+        for inbox in self.inboxes.values():
+            inbox.put((slot, list(frame_ids)))
+        self.in_flight.append((frame_ids, frames))
+        while len(self.in_flight) > self.depth:
+            yield self.join_oldest()
+
+    def join_oldest(self):
+        frame_ids, frames = self.in_flight.popleft()
+        results = {}
+        for name in self.stages:
+            results[name], seconds = self.receive(name, "batch")
+            self.profiler.record(name, "worker", seconds, len(frame_ids))
+        return frame_ids, frames, results
+
+    def drain(self):
+        while self.in_flight:
+            yield self.join_oldest()
+
+    def finish(self):
+        """Stop the stage processes and return the complete data of every stage, e.g. {"ball": {"ball": {...}}}."""
+        for inbox in self.inboxes.values():
+            inbox.put(None)
+        results = {name: self.receive(name, "done")[0] for name in self.stages}
+        for process in self.processes.values():
+            process.join()
+        return results
+
+    def close(self):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        del self.slots
+        self.shm.close()
+        self.shm.unlink()
+
+
+def stage_executor(mode, config, stages, frame_width, frame_height, batch_size=1, depth=1):
+    # the runner of mode ("off", "threads" or "processes") for a {stage name: tracker} dict
+    if mode not in CONCURRENCY_MODES:
+        raise ValueError(f"Unknown concurrent_stages mode: {mode}")
+    if mode == "threads":
+        return StageThreads(stages, depth)
+    if mode == "processes":
+        return StageProcesses(config, list(stages), frame_width, frame_height, batch_size, depth,
+                              stage_core_sets(config, list(stages)))
+    return SerialStages(stages)
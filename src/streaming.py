@@ -0,0 +1,153 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+# constants for easy configuration
+DEFAULT_TARGET_LATENCY = 0.5  # seconds from capture to emitted result
+DEFAULT_MAX_CONSECUTIVE_SKIPS = 30  # always process at least one frame in this many
+DEFAULT_METRICS_INTERVAL = 5.0  # seconds between metrics records
+EMA_DECAY = 0.9  # smoothing of the processing time estimate
+LATENCY_WINDOW = 1000  # recent frames used for latency percentiles
+
+
+def open_stream(source):
+    # camera index ("0"), stream URL (rtsp://, http://) or a local file
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return cv2.VideoCapture(source)
+
+
+class LatestFrameReader:
+    # capture on a background thread and keep only the newest frame, so a slow consumer
+    # never works through a backlog; frames replaced before being read are counted as dropped
+    def __init__(self, source, realtime=False):
+        self.cap = open_stream(source)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open stream: {source}")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.realtime = realtime  # pace a local file at its frame rate to stand in for a live feed
+        self.num_captured = 0
+        self.num_dropped = 0
+
+        self.latest = None  # (frame_id, frame, capture_time)
+        self.finished = False
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._capture, daemon=True)
+        self.thread.start()
+
+    def _capture(self):
+        start_time = time.monotonic()
+        frame_id = 0
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+
+                if self.realtime:
+                    # release frame i at start + i / fps like a live source would
+                    delay = start_time + frame_id / self.fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                with self.condition:
+                    if self.latest is not None:
+                        self.num_dropped += 1
+                    self.latest = (frame_id, frame, time.monotonic())
+                    self.num_captured += 1
+                    self.condition.notify()
+                frame_id += 1
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    def read(self):
+        # newest unread frame, or None once the stream has ended
+        with self.condition:
+            while self.latest is None and not self.finished:
+                self.condition.wait()
+            item, self.latest = self.latest, None
+            return item
+
+    def release(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.cap.release()
+
+
+class FrameSkipPolicy:
+    # skip frames that cannot be finished inside the latency budget, based on a running estimate of
+    # processing time; never skip more than max_consecutive_skips frames in a row
+    def __init__(self, target_latency=DEFAULT_TARGET_LATENCY, max_consecutive_skips=DEFAULT_MAX_CONSECUTIVE_SKIPS):
+        self.target_latency = target_latency
+        self.max_consecutive_skips = max_consecutive_skips
+        self.processing_time = 0.0
+        self.consecutive_skips = 0
+
+    def should_process(self, frame_age):
+        if frame_age + self.processing_time <= self.target_latency or \
+                self.consecutive_skips >= self.max_consecutive_skips:
+            self.consecutive_skips = 0
+            return True
+        self.consecutive_skips += 1
+        return False
+
+    def update(self, processing_time):
+        self.processing_time = EMA_DECAY * self.processing_time + (1 - EMA_DECAY) * processing_time
+
+
+class StreamMetrics:
+    # frame-rate and lag counters of a streaming run
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.num_processed = 0
+        self.num_skipped = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self, reader):
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        latencies = np.asarray(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "elapsed": round(elapsed, 3),
+            "input_fps": round(reader.num_captured / elapsed, 2),
+            "processed_fps": round(self.num_processed / elapsed, 2),
+            "frames_processed": self.num_processed,
+            "frames_skipped": self.num_skipped,
+            "frames_dropped": reader.num_dropped,
+            "latency_p50": round(float(np.percentile(latencies, 50)), 4),
+            "latency_p95": round(float(np.percentile(latencies, 95)), 4),
+            "latency_max": round(float(latencies.max()), 4)
+        }
+
+
+class JsonLinesEmitter:
+    # write one JSON object per line to a file or to a tcp://host:port listener
+    def __init__(self, output):
+        self.sock = None
+        if output.startswith("tcp://"):
+            host, port = output[len("tcp://"):].rsplit(":", 1)
+            self.sock = socket.create_connection((host, int(port)))
+            self.stream = self.sock.makefile("w")
+        else:
+            if os.path.dirname(output):
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+            self.stream = open(output, "w")
+
+    def emit(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+        if self.sock is not None:
+            self.sock.close()
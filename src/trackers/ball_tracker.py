@@ -1,20 +1,48 @@
-from ultralytics import YOLO
 from tqdm import tqdm
-import cv2
 import os
-import json
-from src.utils.io import save_json_data
+from src.utils.io import save_tracking_data, load_tracking_data
+from src.utils.cache import file_digest
+from src.utils.backends import LazyModel
+from src.utils.profiler import NULL_PROFILER
+from src.utils.video import open_frame_reader, batched
+from src.trackers.trajectory import KalmanTrajectory, smooth_track
 
 # constants for easy configuration
 DEFAULT_FRAME_SIZE = 640
+DEFAULT_IMGSZ = 640  # model input size
+DEFAULT_CONF = 0.30  # minimum detection confidence
 MAX_HISTORY = 5
 MAX_MISSED_THRESHOLD = 5
+DEFAULT_BATCH_SIZE = 1
+TILE_OVERLAP = 0.2  # overlap between tiles of the sliced full-frame search
+TRAJECTORIES = ("linear", "kalman")
+
+
+def candidate_boxes(results, windows=None):
+    # (bbox, conf) of every box over the results of one frame's search windows, in frame coordinates,
+    # most confident first
+    candidates = []
+    for i, result in enumerate(results):
+        if result is None or len(result.boxes) == 0:
+            continue
+        x_offset, y_offset = windows[i][:2] if windows else (0, 0)
+        for (x1, y1, x2, y2), conf in zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist()):
+            candidates.append(([x1 + x_offset, y1 + y_offset, x2 + x_offset, y2 + y_offset], conf))
+    candidates.sort(key=lambda candidate: -candidate[1])
+    return candidates
+
 
 class BallTracker:
     def __init__(self, model_path, video_path, mask_path,
-                 max_history=MAX_HISTORY, max_missed_threshold=MAX_MISSED_THRESHOLD):
-        # load YOLO model and set basic attributes
-        self.model = YOLO(model_path)
+                 max_history=MAX_HISTORY, max_missed_threshold=MAX_MISSED_THRESHOLD,
+                 batch_size=DEFAULT_BATCH_SIZE, queue_size=0, output_format="json",
+                 roi_size=0, tile_fallback=False, trajectory="linear", smoothing=False,
+                 backend_options=None, device=None):
+        # YOLO model (on the configured inference backend) and basic attributes
+        self.backend_options = backend_options or {}
+        self.model = LazyModel(model_path, **self.backend_options)  # loaded on first use
+        self.device = device  # e.g. "cuda:0" or "cpu", None lets ultralytics pick
+        self.model_path = model_path
         self.video_path = video_path
         self.output_dir = "outputs/tracking_data"
         self.tracking_data = {"ball": {}}
@@ -24,6 +52,21 @@ class BallTracker:
         self.max_missed_threshold = max_missed_threshold
         self.frame_width = DEFAULT_FRAME_SIZE  # default video width
         self.frame_height = DEFAULT_FRAME_SIZE  # default video height
+        self.batch_size = batch_size  # number of frames per model call
+        self.queue_size = queue_size  # decoded frames buffered ahead of inference, 0 decodes inline
+        self.output_format = output_format  # "json", "columnar" or "both"
+        self.profiler = NULL_PROFILER  # replaced by a Profiler to record step timings
+        self.imgsz = DEFAULT_IMGSZ
+        self.conf = DEFAULT_CONF
+        self.roi_size = roi_size  # side of the crop searched around the expected ball position, 0 searches full frames
+        self.tile_fallback = tile_fallback  # search the lost ball with roi_size tiles instead of one downscaled frame
+        if trajectory not in TRAJECTORIES:
+            raise ValueError(f"Unknown trajectory: {trajectory}")
+        # "linear" extrapolates the last two positions, "kalman" filters and gates detections
+        self.trajectory = trajectory
+        self.kalman = KalmanTrajectory(self.frame_width, self.frame_height, max_missed_threshold) \
+            if trajectory == "kalman" else None
+        self.smoothing = smoothing  # smooth the finished track and fill short gaps before saving
 
         # create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
@@ -56,11 +99,89 @@ class BallTracker:
 
     def detect_ball(self, frame):
         # detect ball in the frame using YOLO
-        results = self.model.predict(source=frame, imgsz=640, conf=0.30, verbose=False)
+        return self.detect_balls([frame])[0]
+
+    def detect_balls(self, frames):
+        # detect ball in a batch of frames with one YOLO call, then update state in frame order
+        frames = list(frames)
+        if not self.roi_size:
+            results = self.predict(frames, self.imgsz, len(frames))
+            with self.profiler.stage("ball", "postprocess", len(frames)):
+                return [self.update_from_candidates(candidate_boxes([result])) for result in results]
+
+        # every window depends on the state after the previous frame, so ROI searches run frame by frame and
+        # the track does not depend on batch_size
+        return [self.detect_roi(frame) for frame in frames]
+
+    def detect_roi(self, frame):
+        # search roi_size windows of one frame: around the expected ball position, or tiles over the frame
+        # (one model call) when the ball is lost and tile_fallback is on, else the downscaled full frame
+        expected_centers = self.expected_centers(1)
+        if expected_centers is not None:
+            windows = [self.roi_window(expected_centers[0])]
+        elif self.tile_fallback:
+            windows = self.tiles()
+        else:
+            results = self.predict([frame], self.imgsz, 1)
+            with self.profiler.stage("ball", "postprocess", 1):
+                return self.update_from_candidates(candidate_boxes(results))
+
+        with self.profiler.stage("ball", "crop", 1):
+            crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+        results = self.predict(crops, self.roi_size, 1)
+        with self.profiler.stage("ball", "postprocess", 1):
+            return self.update_from_candidates(candidate_boxes(results, windows))
+
+    def predict(self, images, imgsz, num_frames):
+        # one YOLO call over a list of frames or crops taken from num_frames frames
+        results = self.model.predict(source=images, imgsz=imgsz, conf=self.conf, device=self.device, verbose=False)
+        self.profiler.record_results("ball", results, num_frames)
+        return results
+
+    def expected_centers(self, num_frames):
+        # extrapolated ball centers for the next frames, or None when the ball is lost
+        if self.kalman is not None:
+            return self.kalman.expected_centers(num_frames)
+        if self.missed_frame_count >= self.max_missed_threshold or len(self.history) < 1:
+            return None
+
+        last_pos = self.history[-1]
+        if len(self.history) == 1:
+            return [last_pos] * num_frames
+
+        prev_pos = self.history[-2]
+        velocity = (last_pos[0] - prev_pos[0], last_pos[1] - prev_pos[1])
+        return [(last_pos[0] + velocity[0] * step, last_pos[1] + velocity[1] * step)
+                for step in range(1, num_frames + 1)]
+
+    def roi_window(self, center):
+        # roi_size square around center at native resolution, shifted to stay inside the frame
+        width, height = min(self.roi_size, self.frame_width), min(self.roi_size, self.frame_height)
+        x1 = int(min(max(center[0] - width / 2, 0), self.frame_width - width))
+        y1 = int(min(max(center[1] - height / 2, 0), self.frame_height - height))
+        return x1, y1, x1 + width, y1 + height
+
+    def tiles(self):
+        # overlapping roi_size tiles covering the frame for the sliced full search
+        def starts(length):
+            if length <= self.roi_size:
+                return [0]
+            step = int(self.roi_size * (1 - TILE_OVERLAP))
+            return sorted(set(list(range(0, length - self.roi_size, step)) + [length - self.roi_size]))
+
+        return [(x, y, min(x + self.roi_size, self.frame_width), min(y + self.roi_size, self.frame_height))
+                for y in starts(self.frame_height) for x in starts(self.frame_width)]
 
-        if results and len(results[0].boxes) > 0:
-            box = results[0].boxes[0]
-            bbox = box.xyxy[0].tolist()
+    def update_from_candidates(self, candidates):
+        # update the trajectory from one frame's (bbox, conf) candidates; the Kalman filter rejects boxes off
+        # the trajectory, the linear mode takes the most confident one
+        if self.kalman is not None:
+            return self.kalman.update(candidates)
+        return self.update_from_detection(*candidates[0]) if candidates else self.update_from_detection(None)
+
+    def update_from_detection(self, bbox, conf=None):
+        # update history from one frame's best detection (None when nothing was detected) and its confidence
+        if bbox is not None:
             center = [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2]
 
             # reset missed count and update history when ball is detected
@@ -68,46 +189,95 @@ class BallTracker:
             if len(self.history) >= self.max_history:
                 self.history.pop(0)
             self.history.append(center)
-            return {"bbox": bbox, "center": center}
+            return {"bbox": bbox, "center": center, "conf": conf}
 
         # if no detection, predict position
         self.missed_frame_count += 1
         return self.predict_missing_frame()
 
-    def process_video(self, read_from_json=True, json_path=None):
-        # load tracking data from JSON if specified
-        if read_from_json and json_path and os.path.isfile(json_path):
-            with open(json_path, 'r') as f:
-                return json.load(f)
+    def cache_params(self):
+        # everything besides the video that changes this stage's results
+        return {"stage": "ball", "model": file_digest(self.model_path), "imgsz": self.imgsz, "conf": self.conf,
+                "max_history": self.max_history, "max_missed_threshold": self.max_missed_threshold,
+                "roi_size": self.roi_size, "tile_fallback": self.tile_fallback, "trajectory": self.trajectory,
+                "backend": self.backend_options.get("backend", "torch"),
+                "precision": self.backend_options.get("precision", "fp32")}
 
-        # open video file
-        cap = cv2.VideoCapture(self.video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Cannot open video: {self.video_path}")
-
-        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        # set frame dimensions from video
-        self.frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        # process each frame with progress bar
-        with tqdm(total=num_frames, desc='Ball tracking | Processing video...', colour='cyan') as pbar:
-            frame_id = 0
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    # end of video
-                    pbar.close()
-                    break
-
-                self.tracking_data["ball"][frame_id] = self.detect_ball(frame)
-                frame_id += 1
-                pbar.update(1)
-
-        cap.release()
+    def predict_options(self):
+        # input size and confidence of full-frame searches, e.g. for checking an exported backend against them;
+        # ROI crops run at roi_size
+        return {"imgsz": self.imgsz, "conf": self.conf}
+
+    def get_state(self):
+        # sequential state carried from one frame to the next
+        if self.kalman is not None:
+            return self.kalman.get_state()
+        return {"history": list(self.history), "missed_frame_count": self.missed_frame_count}
+
+    def set_state(self, state):
+        # None starts from a clean state
+        if self.kalman is not None:
+            self.kalman.set_state(state)
+            return
+        state = state or {"history": [], "missed_frame_count": 0}
+        self.history = list(state["history"])
+        self.missed_frame_count = state["missed_frame_count"]
+
+    def set_video(self, video_path, output_dir=None):
+        # start on another video with the loaded model, e.g. the next job of a batch
+        self.video_path = video_path
+        self.tracking_data = {"ball": {}}
+        self.set_state(None)
+        if output_dir is not None:
+            self.output_dir = output_dir
+            os.makedirs(self.output_dir, exist_ok=True)
 
+    def set_frame_size(self, frame_width, frame_height):
+        # frame size bounds the predicted ball positions
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        if self.kalman is not None:
+            self.kalman.frame_width, self.kalman.frame_height = frame_width, frame_height
+
+    def process_frame(self, frame_id, frame):
+        # detect ball in a single decoded frame and store the result
+        ball_info = self.detect_ball(frame)
+        self.tracking_data["ball"][frame_id] = ball_info
+        return ball_info
+
+    def process_batch(self, frame_ids, frames):
+        # detect ball in a batch of decoded frames and store the results
+        ball_infos = self.detect_balls(frames)
+        for frame_id, ball_info in zip(frame_ids, ball_infos):
+            self.tracking_data["ball"][frame_id] = ball_info
+        return ball_infos
+
+    def save_data(self):
         # path of json data
         output_path = os.path.join(self.output_dir, 'ball.json')
-        save_json_data(self.tracking_data, output_path) # save results after processing
+        if self.smoothing:
+            with self.profiler.stage("ball", "smooth", len(self.tracking_data["ball"])):
+                self.tracking_data["ball"] = smooth_track(self.tracking_data["ball"])
+        with self.profiler.stage("ball", "serialize", len(self.tracking_data["ball"])):
+            save_tracking_data(self.tracking_data, output_path, self.output_format)  # save results after processing
+
+    def process_video(self, read_from_json=True, json_path=None):
+        # load saved tracking data (columnar store or JSON) if specified
+        if read_from_json:
+            saved_data = load_tracking_data(json_path)
+            if saved_data is not None:
+                return saved_data
+
+        # open video file
+        with open_frame_reader(self.video_path, self.queue_size) as reader:
+            # set frame dimensions from video
+            self.set_frame_size(reader.frame_width, reader.frame_height)
+
+            # process each frame with progress bar
+            with tqdm(total=reader.num_frames, desc='Ball tracking | Processing video...', colour='cyan') as pbar:
+                for frame_ids, frames in batched(self.profiler.timed_frames(reader, "ball"), self.batch_size):
+                    self.process_batch(frame_ids, frames)
+                    pbar.update(len(frame_ids))
 
-        return self.tracking_data
\ No newline at end of file
+        self.save_data()
+        return self.tracking_data
@@ -1,89 +1,195 @@
-import cv2
-from src.utils.io import save_json_data
-from src.utils.img_utils import foot_pos, load_mask
+from src.utils.io import save_tracking_data, load_tracking_data
+from src.utils.cache import file_digest
+from src.utils.backends import LazyModel
+from src.utils.profiler import NULL_PROFILER
+from src.utils.video import open_frame_reader, batched
+from src.utils.img_utils import load_court_mask
+from src.utils.stride import FrameStride, interpolate_players, DEFAULT_MOTION_THRESHOLD
 import os
-import json
-from ultralytics import YOLO
+import numpy as np
 from tqdm import tqdm
 
+# constants for easy configuration
+DEFAULT_BATCH_SIZE = 1
+DEFAULT_TRACKER = 'bytetrack.yaml'
+DEFAULT_CONF = 0.1  # minimum detection confidence passed to ByteTrack (the ultralytics track default)
+
 class PlayerTracker:
-    def __init__(self, model_path, video_path, mask_path=None):
-        # load YOLO model and set basic attributes
-        self.model = YOLO(model_path)
-        self.mask = load_mask(mask_path)
+    def __init__(self, model_path, video_path, mask_path=None, batch_size=DEFAULT_BATCH_SIZE, queue_size=0,
+                 output_format="json", stride=1, adaptive_stride=False, motion_threshold=DEFAULT_MOTION_THRESHOLD,
+                 backend_options=None, device=None):
+        # YOLO model (on the configured inference backend) and basic attributes
+        self.backend_options = backend_options or {}
+        self.model = LazyModel(model_path, **self.backend_options)  # loaded on first use
+        self.device = device  # e.g. "cuda:0" or "cpu", None lets ultralytics pick
+        self.model_path = model_path
+        self.court_mask = load_court_mask(mask_path)
+        self.mask_path = mask_path
         self.video_path = video_path
         self.output_dir = "outputs/tracking_data"
-        self.tracking_data = {"player": {}}  # store tracking data for players
-        self.frame_width = 640
+        # store tracking data for players, plus the frames the stride skipped (also those without any player)
+        self.tracking_data = {"player": {}, "interpolated_frames": []}
+        self.frame_width = 640  # model input size, set to the video width
+        self.conf = DEFAULT_CONF
+        self.batch_size = batch_size  # number of frames per model call
+        self.queue_size = queue_size  # decoded frames buffered ahead of inference, 0 decodes inline
+        self.output_format = output_format  # "json", "columnar" or "both"
+        self.profiler = NULL_PROFILER  # replaced by a Profiler to record step timings
+        self.tracker = DEFAULT_TRACKER  # ultralytics tracker config
+        self.frame_stride = FrameStride(stride, adaptive_stride, motion_threshold)  # frames skipped between inferences
+        self.last_inferred = None  # (frame_id, players) of the last frame the model ran on
+        self.pending = []  # skipped frames since then, interpolated once the next inferred frame is known
 
         # create output directory if it doesn't exist
         if not os.path.isdir(self.output_dir):
             os.makedirs(self.output_dir)
 
+    def cache_params(self):
+        # everything besides the video that changes this stage's results
+        return {"stage": "player", "model": file_digest(self.model_path), "mask": file_digest(self.mask_path),
+                "mask_shape": self.court_mask.mask.shape, "imgsz": self.frame_width,
+                "tracker": file_digest(self.tracker) or self.tracker, "classes": 0, "conf": self.conf,
+                "backend": self.backend_options.get("backend", "torch"),
+                "precision": self.backend_options.get("precision", "fp32"), **self.frame_stride.params()}
+
+    def predict_options(self):
+        # input size, confidence and classes the model runs at, e.g. for checking an exported backend against them
+        return {"imgsz": self.frame_width, "conf": self.conf, "classes": 0}
+
+    def get_state(self):
+        # ByteTrack state cannot be restored, track ids are reconciled instead
+        return None
+
+    def set_state(self, state):
+        # start ByteTrack from scratch, e.g. before resuming at another point of the video
+        trackers = getattr(self.model.predictor, "trackers", None) or []
+        for tracker in trackers:
+            tracker.reset()
+        self.frame_stride.reset()
+        self.last_inferred = None
+        self.pending = []
+
+    def set_frame_size(self, frame_width, frame_height):
+        # players are detected at the video width
+        self.frame_width = frame_width
+
+    def set_video(self, video_path, output_dir=None):
+        # start on another video with the loaded model, e.g. the next job of a batch
+        self.video_path = video_path
+        self.tracking_data = {"player": {}, "interpolated_frames": []}
+        self.set_state(None)
+        if output_dir is not None:
+            self.output_dir = output_dir
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def process_frame(self, frame_id, frame):
+        # detect and track players in a single decoded frame
+        player_info = self.detect_and_track_players(frame, self.frame_width)
+        self.tracking_data["player"][frame_id] = player_info
+        return player_info
+
+    def process_batch(self, frame_ids, frames):
+        # detect and track players in a batch of decoded frames; with a stride only the selected frames are
+        # inferred and the rest get interpolated boxes
+        selected = self.frame_stride.select(frame_ids, frames)
+        inferred = [(frame_id, frame) for frame_id, frame, infer in zip(frame_ids, frames, selected) if infer]
+        player_infos = dict(zip([frame_id for frame_id, _ in inferred],
+                                self.detect_and_track_batch([frame for _, frame in inferred], self.frame_width)
+                                if inferred else []))
+
+        frames_data = self.tracking_data["player"]
+        for frame_id in frame_ids:
+            if frame_id in player_infos:
+                self.interpolate_pending(frame_id, player_infos[frame_id])
+                frames_data[frame_id] = player_infos[frame_id]
+                self.last_inferred = (frame_id, player_infos[frame_id])
+            else:
+                # hold the last inferred players until the next inferred frame replaces them
+                last_players = self.last_inferred[1] if self.last_inferred else {}
+                frames_data[frame_id] = {track_id: {**player, "interpolated": True}
+                                         for track_id, player in last_players.items()}
+                self.pending.append(frame_id)
+                self.tracking_data["interpolated_frames"].append(frame_id)
+        return [frames_data.get(frame_id, {}) for frame_id in frame_ids]
+
+    def interpolate_pending(self, frame_id, players):
+        # fill the skipped frames between the last inferred frame and this one; frames already handed off
+        # (saved to a cache segment, emitted by a stream) keep their held players
+        frames_data = self.tracking_data["player"]
+        prev_id, prev_players = self.last_inferred if self.last_inferred else (frame_id, players)
+        for pending_id in self.pending:
+            if pending_id in frames_data:
+                weight = (pending_id - prev_id) / (frame_id - prev_id)
+                frames_data[pending_id] = interpolate_players(prev_players, players, weight)
+        self.pending = []
+
+    def save_data(self):
+        # save tracking data to file
+        output_path = os.path.join(self.output_dir, 'player.json')
+        with self.profiler.stage("player", "serialize", len(self.tracking_data["player"])):
+            save_tracking_data(self.tracking_data, output_path, self.output_format)
+
     def process_video(self, read_from_json=True, json_path=None):
-        # load tracking data from JSON if specified
-        if read_from_json and json_path is not None and os.path.isfile(json_path):
-            with open(json_path, 'r') as f:
-                return json.load(f)
+        # load saved tracking data (columnar store or JSON) if specified
+        if read_from_json:
+            saved_data = load_tracking_data(json_path)
+            if saved_data is not None:
+                return saved_data
 
         # open video file
-        cap = cv2.VideoCapture(self.video_path)
-        frame_id = 0
-        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-
-        # process each frame with progress bar
-        with tqdm(total=num_frames, desc='Player tracking | Processing video...', colour='cyan') as pg_barr:
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                # detect and track players in current frame
-                player_info = self.detect_and_track_players(frame, self.frame_width)
-                self.tracking_data["player"][frame_id] = player_info
+        with open_frame_reader(self.video_path, self.queue_size) as reader:
+            self.set_frame_size(reader.frame_width, reader.frame_height)
 
-                frame_id += 1
-                pg_barr.update(1)
+            # process each frame with progress bar
+            with tqdm(total=reader.num_frames, desc='Player tracking | Processing video...', colour='cyan') as pg_barr:
+                for frame_ids, frames in batched(self.profiler.timed_frames(reader, "player"), self.batch_size):
+                    self.process_batch(frame_ids, frames)
+                    pg_barr.update(len(frame_ids))
 
-        cap.release()
-
-        # save tracking data to file
-        output_path = os.path.join(self.output_dir, 'player.json')
-
-        save_json_data(self.tracking_data, output_path)
+        self.save_data()
         return self.tracking_data
 
     def detect_and_track_players(self, frame, frame_width):
         # detect and track players using YOLO with ByteTrack
-        result = self.model.track(
-            source=frame,
-            tracker='bytetrack.yaml',
+        return self.detect_and_track_batch([frame], frame_width)[0]
+
+    def detect_and_track_batch(self, frames, frame_width):
+        # detect and track players in a batch of frames with one YOLO call;
+        # persist keeps a single ByteTrack state across frames and calls, so IDs do not depend on batch size
+        results = self.model.track(
+            source=list(frames),
+            tracker=self.tracker,
             imgsz=frame_width,
+            conf=self.conf,
+            device=self.device,
             verbose=False,
+            persist=True,
             classes=0  # class 0 for 'person'
-        )[0]
+        )
+        self.profiler.record_results("player", results)
+        with self.profiler.stage("player", "postprocess", len(results)):
+            return [self.parse_result(result) for result in results]
 
-        # store tracking info for each player
+    def parse_result(self, result):
+        # store tracking info for each player whose feet are on the court
         player_info = {}
         if result.boxes is not None and result.boxes.id is not None:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            track_ids = result.boxes.id.cpu().numpy()
-            confidences = result.boxes.conf.cpu().numpy()
-
-            for bbox, track_id, confidence in zip(boxes, track_ids, confidences):
-                bbox = bbox.tolist()
-                center = [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2]
-                track_id = track_id.item()
-
-                # foot position
-                foot_pos_x, foot_pos_y = foot_pos(bbox)
-                if self.mask[int(foot_pos_y-1), int(foot_pos_x-1)] == 0:  # check if player not in field
-                    continue
-
-                player_info[int(track_id)] = {
+            boxes = result.boxes.xyxy.cpu().numpy().astype(np.float64)
+            track_ids = result.boxes.id.cpu().numpy().astype(np.int64)
+            confs = result.boxes.conf.cpu().numpy()
+            classes = result.boxes.cls.cpu().numpy().astype(np.int64)
+
+            keep = self.court_mask.keep(boxes)  # check if player in field
+            boxes, track_ids, confs, classes = boxes[keep], track_ids[keep], confs[keep], classes[keep]
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+
+            for track_id, bbox, center, conf, class_id in zip(track_ids.tolist(), boxes.tolist(), centers.tolist(),
+                                                              confs.tolist(), classes.tolist()):
+                player_info[track_id] = {
                     "bbox": bbox,
-                    "center": center
+                    "center": center,
+                    "conf": conf,
+                    "class": class_id
                 }
 
-        return player_info
\ No newline at end of file
+        return player_info
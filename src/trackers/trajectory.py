@@ -0,0 +1,159 @@
+import numpy as np
+
+# constants for easy configuration
+DEFAULT_PROCESS_NOISE = 1.0  # variance of the unmodelled change in acceleration per frame (px^2)
+DEFAULT_MEASUREMENT_NOISE = 4.0  # standard deviation of a detected ball center (px)
+DEFAULT_GATE = 13.8  # squared Mahalanobis distance for a detection to belong to the track (chi2, 2 dof, 99.9%)
+DEFAULT_SMOOTHING_WINDOW = 7  # detections per local parabola fit of the offline pass
+DEFAULT_MAX_GAP = 10  # longest run of missing frames the offline pass fills
+DEFAULT_OUTLIER_DISTANCE = 40.0  # px from the fit of its neighbours before a detection is dropped offline
+
+
+class KalmanTrajectory:
+    # constant-acceleration Kalman filter over the ball center; state is [x, y, vx, vy, ax, ay] in px and frames
+    def __init__(self, frame_width, frame_height, max_missed_threshold,
+                 process_noise=DEFAULT_PROCESS_NOISE, measurement_noise=DEFAULT_MEASUREMENT_NOISE, gate=DEFAULT_GATE):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.max_missed_threshold = max_missed_threshold
+        self.gate = gate
+
+        self.F = np.eye(6)
+        self.F[[0, 1, 2, 3], [2, 3, 4, 5]] = 1.0
+        self.F[[0, 1], [4, 5]] = 0.5
+        self.H = np.eye(2, 6)
+        self.Q = process_noise * np.diag([0.25, 0.25, 1.0, 1.0, 1.0, 1.0])
+        self.R = measurement_noise ** 2 * np.eye(2)
+        self.set_state(None)
+
+    def get_state(self):
+        # sequential state carried from one frame to the next
+        return {"x": None if self.x is None else self.x.tolist(), "P": None if self.P is None else self.P.tolist(),
+                "missed_frame_count": self.missed_frame_count}
+
+    def set_state(self, state):
+        # None starts from a clean state
+        state = state or {"x": None, "P": None, "missed_frame_count": 0}
+        self.x = None if state["x"] is None else np.array(state["x"])
+        self.P = None if state["P"] is None else np.array(state["P"])
+        self.missed_frame_count = state["missed_frame_count"]
+
+    def lost(self):
+        return self.x is None or self.missed_frame_count >= self.max_missed_threshold
+
+    def start(self, center):
+        # new track at a detection, with unknown velocity and acceleration
+        self.x = np.array([center[0], center[1], 0.0, 0.0, 0.0, 0.0])
+        self.P = np.diag([self.R[0, 0], self.R[1, 1], 400.0, 400.0, 25.0, 25.0])
+        self.missed_frame_count = 0
+
+    def in_frame(self, center):
+        return 0 <= center[0] <= self.frame_width and 0 <= center[1] <= self.frame_height
+
+    def expected_centers(self, num_frames):
+        # predicted ball centers for the next frames, or None when the ball is lost
+        if self.lost():
+            return None
+        centers, x = [], self.x
+        for _ in range(num_frames):
+            x = self.F @ x
+            centers.append((float(x[0]), float(x[1])))
+        return centers
+
+    def update(self, candidates):
+        """Advance one frame with its (bbox, conf) candidates, most confident first, and return its ball info."""
+        if self.lost():
+            # (re)acquire the ball on the most confident detection
+            if not candidates:
+                self.missed_frame_count += 1
+                return {"bbox": None, "center": None}
+            bbox, conf = candidates[0]
+            self.start([(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2])
+            return {"bbox": bbox, "center": self.x[:2].tolist(), "conf": conf}
+
+        # predict
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+        # gate: keep the candidate closest to the prediction in Mahalanobis distance, reject the rest as outliers
+        if candidates:
+            boxes = np.array([bbox for bbox, _ in candidates], dtype=float)
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            S = self.H @ self.P @ self.H.T + self.R
+            innovations = centers - self.x[:2]
+            distances = np.einsum('ni,ij,nj->n', innovations, np.linalg.inv(S), innovations)
+            best = int(np.argmin(distances))
+            if distances[best] <= self.gate:
+                K = self.P @ self.H.T @ np.linalg.inv(S)
+                self.x = self.x + K @ innovations[best]
+                self.P = (np.eye(6) - K @ self.H) @ self.P
+                self.missed_frame_count = 0
+                return {"bbox": candidates[best][0], "center": self.x[:2].tolist(), "conf": candidates[best][1]}
+
+        # no detection on the trajectory: report the prediction while it stays in frame
+        self.missed_frame_count += 1
+        center = self.x[:2].tolist()
+        if self.lost() or not self.in_frame(center):
+            self.missed_frame_count = max(self.missed_frame_count, self.max_missed_threshold)
+            return {"bbox": None, "center": None}
+        return {"bbox": None, "center": center}
+
+
+def local_parabola_fit(times, values, queries, window, exclude=None):
+    # least-squares parabola through the `window` samples nearest each query time, evaluated at the query;
+    # exclude[i] gives a sample index left out of query i's fit (leave-one-out residuals), -1 for none
+    num_samples = len(times)
+    window = min(window, num_samples)
+    degree = min(2, window - 1 - (exclude is not None))
+    if degree < 0:
+        return np.repeat(values[:1], len(queries), axis=0)
+
+    positions = np.searchsorted(times, queries)
+    starts = np.clip(positions - window // 2, 0, num_samples - window)
+    index = starts[:, None] + np.arange(window)  # (queries, window)
+    offsets = times[index] - queries[:, None]  # centred on the query, so the fit's constant term is the value there
+    design = offsets[..., None] ** np.arange(degree + 1)  # (queries, window, degree + 1)
+    weights = np.ones(index.shape) if exclude is None else (index != exclude[:, None]).astype(float)
+
+    normal = np.einsum('qw,qwi,qwj->qij', weights, design, design) + 1e-9 * np.eye(degree + 1)
+    rhs = np.einsum('qw,qwi,qwk->qik', weights, design, values[index])
+    return np.linalg.solve(normal, rhs)[:, 0, :]
+
+
+def smooth_track(ball_data, window=DEFAULT_SMOOTHING_WINDOW, max_gap=DEFAULT_MAX_GAP,
+                 outlier_distance=DEFAULT_OUTLIER_DISTANCE):
+    """Offline pass over a finished ball track: drop outlier detections, smooth centers with local parabola
+    fits and fill gaps of up to max_gap frames. Returns a new frame_id -> {"bbox", "center"} dict."""
+    frame_ids = sorted(ball_data, key=int)
+    detected = [frame_id for frame_id in frame_ids if ball_data[frame_id] and ball_data[frame_id]["bbox"] is not None]
+    if len(detected) < 3:
+        return dict(ball_data)
+
+    times = np.array([int(frame_id) for frame_id in detected], dtype=float)
+    boxes = np.array([ball_data[frame_id]["bbox"] for frame_id in detected], dtype=float)
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+
+    # outliers: detections far from the parabola through their neighbours
+    fits = local_parabola_fit(times, centers, times, window + 1, exclude=np.arange(len(times)))
+    inliers = np.linalg.norm(centers - fits, axis=1) <= outlier_distance
+    if inliers.sum() < 3:
+        return dict(ball_data)
+    times, centers = times[inliers], centers[inliers]
+
+    # every frame within max_gap frames of an inlier on both sides gets a fitted center
+    all_times = np.array([int(frame_id) for frame_id in frame_ids], dtype=float)
+    next_index = np.clip(np.searchsorted(times, all_times), 0, len(times) - 1)
+    prev_index = np.clip(next_index - (times[next_index] > all_times), 0, len(times) - 1)
+    gap = times[next_index] - times[prev_index] - 1
+    covered = (times[prev_index] <= all_times) & (all_times <= times[next_index]) & \
+        ((gap <= max_gap) | (all_times == times[prev_index]) | (all_times == times[next_index]))
+    fitted = local_parabola_fit(times, centers, all_times[covered], window)
+
+    smoothed = {frame_id: {"bbox": None, "center": None} for frame_id in frame_ids}
+    inlier_ids = {int(frame_id) for frame_id in np.array(detected)[inliers]}
+    for frame_id, center in zip(np.array(frame_ids, dtype=object)[covered], fitted.tolist()):
+        bbox = ball_data[frame_id]["bbox"] if int(frame_id) in inlier_ids else None
+        smoothed[frame_id] = {"bbox": bbox, "center": center}
+        if bbox is not None and ball_data[frame_id].get("conf") is not None:
+            smoothed[frame_id]["conf"] = ball_data[frame_id]["conf"]
+    return smoothed
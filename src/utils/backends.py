@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+import ultralytics
+from ultralytics import YOLO
+from src.utils.cache import file_digest, hash_key
+
+# constants for easy configuration
+DEFAULT_EXPORT_DIR = "models/exported"
+EXPORT_FORMATS = {"onnxruntime": "onnx", "openvino": "openvino", "torchscript": "torchscript"}  # backend -> export format
+BACKENDS = ("torch",) + tuple(EXPORT_FORMATS)
+PRECISIONS = ("fp32", "fp16", "int8")
+EXPORT_INFO = "export.json"  # written next to an exported model, holds the path of the model to load
+
+
+def backend_options(config, stage):
+    # inference backend of one stage from the pipeline config
+    options = (config.get("model_backends") or {}).get(stage) or {}
+    return {"backend": options.get("backend", "torch"), "precision": options.get("precision", "fp32"),
+            "calibration_data": options.get("calibration_data"),
+            "export_dir": config.get("export_dir", DEFAULT_EXPORT_DIR)}
+
+
+def stage_device(config, stage):
+    # device the stage's model runs on, e.g. "cuda:1" or "cpu"; None lets ultralytics pick
+    return (config.get("devices") or {}).get(stage) or None
+
+
+def check_backend(backend, precision, calibration_data=None):
+    # fail early on backend and precision combinations that cannot be exported or run
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    if backend == "torch" and precision != "fp32":
+        raise ValueError("The torch backend runs the .pt checkpoint as is, use an exported backend for fp16/int8")
+    if precision == "int8" and backend == "torchscript":
+        raise ValueError("int8 is supported for the onnxruntime and openvino backends")
+    if precision == "int8" and backend == "openvino" and not calibration_data:
+        raise ValueError("openvino int8 quantization needs calibration_data (a dataset yaml)")
+
+
+def load_model(model_path, backend="torch", precision="fp32", calibration_data=None, export_dir=DEFAULT_EXPORT_DIR):
+    """YOLO model on the given backend; non-torch backends are exported per input size and loaded from the export cache."""
+    check_backend(backend, precision, calibration_data)
+    if backend == "torch":
+        return YOLO(model_path)
+    if not os.path.isfile(model_path):
+        raise ValueError(f"Model not found: {model_path}")
+    return ExportedModel(model_path, backend, precision, calibration_data, export_dir)
+
+
+class LazyModel:
+    # load_model() on first use, so a process that only hands frames to stage processes (concurrent_stages:
+    # processes) never loads the models itself; the backend options are still checked right away
+    def __init__(self, model_path, **backend_options):
+        check_backend(backend_options.get("backend", "torch"), backend_options.get("precision", "fp32"),
+                      backend_options.get("calibration_data"))
+        self.model_path = model_path
+        self.backend_options = backend_options
+        self.loaded = None
+
+    def load(self):
+        if self.loaded is None:
+            self.loaded = load_model(self.model_path, **self.backend_options)
+        return self.loaded
+
+    @property
+    def predictor(self):
+        # None until the model is loaded, like a YOLO model before its first call
+        return self.loaded.predictor if self.loaded is not None else None
+
+    def predict(self, *args, **kwargs):
+        return self.load().predict(*args, **kwargs)
+
+    def track(self, *args, **kwargs):
+        return self.load().track(*args, **kwargs)
+
+
+class ExportedModel:
+    # the predict/track interface of YOLO over exported models, with one export per input size the stage
+    # predicts at (ball frames and ROI crops, players at the video width), so a static graph such as torchscript
+    # always runs at the size it was exported for
+    def __init__(self, model_path, backend, precision="fp32", calibration_data=None, export_dir=DEFAULT_EXPORT_DIR):
+        self.model_path = model_path
+        self.backend = backend
+        self.precision = precision
+        self.calibration_data = calibration_data
+        self.export_dir = export_dir
+        self.models = {}  # imgsz -> YOLO of that export
+        self.current = None  # model of the last call, holds the tracker state between track() calls
+
+    def model_for(self, imgsz):
+        if imgsz not in self.models:
+            self.models[imgsz] = YOLO(exported_model(self.model_path, self.backend, self.precision, imgsz,
+                                                     self.calibration_data, self.export_dir), task="detect")
+        self.current = self.models[imgsz]
+        return self.current
+
+    @property
+    def predictor(self):
+        return self.current.predictor if self.current is not None else None
+
+    def predict(self, source, imgsz=640, **kwargs):
+        return self.model_for(imgsz).predict(source=source, imgsz=imgsz, **kwargs)
+
+    def track(self, source, imgsz=640, **kwargs):
+        return self.model_for(imgsz).track(source=source, imgsz=imgsz, **kwargs)
+
+
+def exported_model(model_path, backend, precision="fp32", imgsz=640, calibration_data=None,
+                   export_dir=DEFAULT_EXPORT_DIR):
+    # path of the model exported at input size imgsz, exporting it first when the checkpoint, the options
+    # or ultralytics changed
+    check_backend(backend, precision, calibration_data)
+    digest = file_digest(model_path)
+    if digest is None:
+        raise ValueError(f"Model not found: {model_path}")
+    key = hash_key("export", digest, backend, precision, imgsz, calibration_data, ultralytics.__version__)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    target_dir = os.path.join(export_dir, f"{stem}_{backend}_{precision}_{key[:12]}")
+    info_path = os.path.join(target_dir, EXPORT_INFO)
+    if os.path.isfile(info_path):
+        with open(info_path) as f:
+            return os.path.join(target_dir, json.load(f)["model"])
+
+    # export in a private directory and publish it with one rename, so concurrent workers never load a partial export
+    work_dir = f"{target_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    local_path = os.path.join(work_dir, os.path.basename(model_path))
+    shutil.copy2(model_path, local_path)
+
+    print(f"Exporting {model_path} to {backend} ({precision})...")
+    exported = YOLO(local_path).export(format=EXPORT_FORMATS[backend], imgsz=imgsz, half=precision == "fp16",
+                                       int8=precision == "int8" and backend == "openvino", data=calibration_data,
+                                       dynamic=backend != "torchscript", verbose=False)
+    if precision == "int8" and backend == "onnxruntime":
+        exported = quantize_onnx(exported)
+    os.remove(local_path)
+
+    with open(os.path.join(work_dir, EXPORT_INFO), "w") as f:
+        json.dump({"model": os.path.relpath(exported, work_dir), "source": os.path.abspath(model_path),
+                   "digest": digest, "backend": backend, "precision": precision, "imgsz": imgsz,
+                   "ultralytics": ultralytics.__version__}, f, indent=2)
+    try:
+        os.replace(work_dir, target_dir)
+    except OSError:
+        shutil.rmtree(work_dir)  # another worker published the same export first
+    with open(info_path) as f:
+        return os.path.join(target_dir, json.load(f)["model"])
+
+
+def quantize_onnx(onnx_path):
+    # dynamic INT8 quantization of the weights; activations are quantized on the fly by onnxruntime
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("onnxruntime is required for int8 quantization: pip install onnxruntime") from e
+    quantized_path = os.path.splitext(onnx_path)[0] + "_int8.onnx"
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+
+    # keep the class names and stride ultralytics stores in the model metadata
+    import onnx
+    quantized = onnx.load(quantized_path)
+    if not quantized.metadata_props:
+        quantized.metadata_props.extend(onnx.load(onnx_path).metadata_props)
+        onnx.save(quantized, quantized_path)
+    os.remove(onnx_path)
+    return quantized_path
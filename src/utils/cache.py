@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import pickle
+import cv2
+from src.utils.video import FrameReader
+
+# constants for easy configuration
+DEFAULT_SEGMENT_SIZE = 500  # frames per cache segment
+DEFAULT_MAX_CACHE_SIZE = 20 * 1024 ** 3  # bytes kept on disk before LRU eviction
+HASH_CHUNK_SIZE = 1 << 20
+FRAME_DIGEST_STRIDE = 4  # every n-th pixel row/column is hashed per frame, when packets cannot be read
+EVICT_TARGET = 0.9  # share of max_size an eviction frees down to, so the next puts do not rescan right away
+PACKET_REORDER_MARGIN = 16  # packets past a segment end that its digest also covers
+
+_file_digests = {}  # (path, size, mtime) -> digest, so large files are hashed once per process
+
+
+def file_digest(path):
+    # content hash of a file, None for missing paths
+    if not path or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        hasher = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        _file_digests[memo_key] = hasher.hexdigest()
+    return _file_digests[memo_key]
+
+
+def hash_key(*parts):
+    # stable cache key from JSON-serialisable parts
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+def segment_digests(video_path, segment_size=DEFAULT_SEGMENT_SIZE):
+    # digest per segment that also covers every frame before it, since tracker state carries over, so appending
+    # to a video keeps the digests of the unchanged head; hashes the compressed packets, which are demuxed without
+    # decoding, and falls back to decoded frames when the video backend cannot return packets
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+    try:
+        if not cap.isOpened() or not cap.set(cv2.CAP_PROP_FORMAT, -1):
+            return decoded_segment_digests(video_path, segment_size)
+        return chained_digests((packet.tobytes() for packet in iter_packets(cap)), segment_size,
+                               PACKET_REORDER_MARGIN)
+    finally:
+        cap.release()
+
+
+def iter_packets(cap):
+    while True:
+        ok, packet = cap.read()
+        if not ok:
+            return
+        yield packet
+
+
+def decoded_segment_digests(video_path, segment_size=DEFAULT_SEGMENT_SIZE):
+    # same digests from every FRAME_DIGEST_STRIDE-th pixel of the decoded frames
+    with FrameReader(video_path) as reader:
+        return chained_digests((frame[::FRAME_DIGEST_STRIDE, ::FRAME_DIGEST_STRIDE].tobytes() for _, frame in reader),
+                               segment_size)
+
+
+def chained_digests(chunks, segment_size, margin=0):
+    # digest of segment s hashes the per-frame chunks [0, (s + 1) * segment_size + margin); the margin covers
+    # packets that B-frames move past the segment end in decode order
+    digests = []
+    hasher = hashlib.blake2b(digest_size=20)
+    num_chunks = 0
+    for chunk in chunks:
+        hasher.update(chunk)
+        num_chunks += 1
+        if num_chunks > margin and (num_chunks - margin) % segment_size == 0:
+            digests.append(hasher.hexdigest())
+
+    # segments whose end plus margin is past the last frame hash the whole video, and their index keeps them apart
+    for segment in range(len(digests), -(-num_chunks // segment_size)):
+        tail = hasher.copy()
+        tail.update(str(segment).encode())
+        digests.append(tail.hexdigest())
+    return digests
+
+
+class ResultCache:
+    # content-addressed results on disk with size-bounded least-recently-used eviction
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.total_size = None  # bytes of all entries, counted by the first evict()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # mark as recently used
+        os.utime(path)
+        return value
+
+    def delete(self, key):
+        # drop one entry, e.g. to force a segment to be recomputed
+        path = self._path(key)
+        if os.path.isfile(path):
+            if self.total_size is not None:
+                self.total_size -= os.path.getsize(path)
+            os.remove(path)
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaced_size = os.path.getsize(path) if os.path.isfile(path) else 0
+
+        # write then rename so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(tmp_path, path)
+
+        # the directory is only scanned once per process and again when the running total exceeds max_size;
+        # other processes writing to the same cache are picked up by that scan
+        if self.total_size is None:
+            self.evict()
+        else:
+            self.total_size += size - replaced_size
+            if self.total_size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        # delete least recently used entries until the cache fits in EVICT_TARGET of max_size, recounting the total
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.pkl'):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+        total_size = sum(size for _, size, _ in entries)
+        if total_size > self.max_size:
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size * EVICT_TARGET:
+                    break
+                os.remove(path)
+                total_size -= size
+        self.total_size = total_size
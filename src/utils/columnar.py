@@ -0,0 +1,245 @@
+import os
+import tempfile
+import numpy as np
+
+# column name -> (dtype, row shape)
+COLUMNS = {
+    "frame_id": (np.int32, ()),
+    "track_id": (np.int32, ()),
+    "bbox": (np.float32, (4,)),
+    "center": (np.float32, (2,)),
+    "class": (np.int16, ()),
+    "conf": (np.float32, ()),
+}
+NO_ID = -1  # track_id / class of rows without one
+DEFAULT_CHUNK_FRAMES = 1000  # frames whose rows are buffered as Python lists before becoming numpy columns
+
+
+class TrackStore:
+    # tracking results of one stage ("ball", "player" or "action") as flat per-detection columns;
+    # rows are sorted by frame_id and frame_offsets[f]:frame_offsets[f + 1] is the row slice of frame f;
+    # interpolated[f] marks frames whose results were interpolated instead of inferred
+    def __init__(self, kind, columns, frame_offsets, interpolated=None):
+        self.kind = kind
+        self.columns = columns
+        self.frame_offsets = frame_offsets
+        self.interpolated = interpolated if interpolated is not None else np.zeros(len(frame_offsets) - 1, dtype=bool)
+
+    @property
+    def num_frames(self):
+        return len(self.frame_offsets) - 1
+
+    def __len__(self):
+        return len(self.columns["frame_id"])
+
+    @classmethod
+    def from_tracking_data(cls, data):
+        # build from the {"ball" | "player" | "action": {frame_id: info}} dicts produced by the trackers,
+        # player data also lists the frames the stride skipped in "interpolated_frames"
+        kind = next(key for key in data if key != "interpolated_frames")
+        return cls.from_frames(kind, sorted(data[kind].items(), key=lambda item: int(item[0])),
+                               data.get("interpolated_frames", ()))
+
+    @classmethod
+    def from_frames(cls, kind, frames, interpolated_frame_ids=(), chunk_frames=DEFAULT_CHUNK_FRAMES):
+        # build from (frame_id, info) pairs in frame order; rows are converted to numpy per chunk of frames
+        buffer = RowBuffer(kind)
+        chunks = []
+        num_frames = 0
+        interpolated_frame_ids = {int(frame_id) for frame_id in interpolated_frame_ids}
+        for i, (frame_id, info) in enumerate(frames, 1):
+            num_frames = int(frame_id) + 1
+            buffer.add_frame(int(frame_id), info, int(frame_id) in interpolated_frame_ids)
+            if i % chunk_frames == 0:
+                chunks.append(buffer.take())
+        chunks.append(buffer.take())
+
+        columns = {name: np.concatenate([columns[name] for columns, _ in chunks]) for name in COLUMNS}
+        interpolated = interpolated_frames(np.concatenate([ids for _, ids in chunks]), num_frames)
+        return cls(kind, columns, frame_offsets_for(columns["frame_id"], num_frames), interpolated)
+
+    def frame(self, frame_id):
+        # O(1) column slices of one frame; mem-mapped columns are only read here
+        if not 0 <= frame_id < self.num_frames:
+            return {name: column[:0] for name, column in self.columns.items()}
+        start, end = self.frame_offsets[frame_id], self.frame_offsets[frame_id + 1]
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+    def frame_entry(self, frame_id):
+        # one frame in the same layout as the JSON output
+        rows = self.frame(frame_id)
+        marker = {"interpolated": True} if 0 <= frame_id < self.num_frames and self.interpolated[frame_id] else {}
+        if self.kind == "ball":
+            if len(rows["frame_id"]) == 0:
+                return {"bbox": None, "center": None}
+            bbox, conf = rows["bbox"][0], float(rows["conf"][0])
+            entry = {"bbox": None if np.isnan(bbox).any() else bbox.tolist(), "center": rows["center"][0].tolist()}
+            return entry if np.isnan(conf) else {**entry, "conf": conf}
+        if self.kind == "player":
+            players = {}
+            for track_id, bbox, center, class_id, conf in zip(rows["track_id"], rows["bbox"], rows["center"],
+                                                              rows["class"], rows["conf"]):
+                player = {"bbox": bbox.tolist(), "center": center.tolist()}
+                if not np.isnan(conf):
+                    player["conf"] = float(conf)
+                if class_id != NO_ID:
+                    player["class"] = int(class_id)
+                players[int(track_id)] = {**player, **marker}
+            return players
+        entry = {"bbox": rows["bbox"].tolist(), "class": rows["class"].astype(float).tolist()}
+        if not np.isnan(rows["conf"]).any():
+            entry["conf"] = rows["conf"].astype(float).tolist()
+        return {**entry, **marker}
+
+    def to_tracking_data(self):
+        # JSON export path
+        data = {self.kind: {str(frame_id): self.frame_entry(frame_id) for frame_id in range(self.num_frames)}}
+        if self.kind == "player":
+            data["interpolated_frames"] = np.flatnonzero(self.interpolated).tolist()
+        return data
+
+    def save(self, path):
+        # .npz archive, or a directory of .npy files that can be memory-mapped on load
+        if path.endswith(".npz"):
+            np.savez(path, kind=np.array(self.kind), frame_offsets=self.frame_offsets, interpolated=self.interpolated,
+                     **self.columns)
+        else:
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, "kind.npy"), np.array(self.kind))
+            np.save(os.path.join(path, "frame_offsets.npy"), self.frame_offsets)
+            np.save(os.path.join(path, "interpolated.npy"), self.interpolated)
+            for name, column in self.columns.items():
+                np.save(os.path.join(path, f"{name}.npy"), column)
+        print(f"Tracking data saved to {path}")
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        if path.endswith(".npz"):
+            with np.load(path) as archive:
+                columns = {name: archive[name] for name in COLUMNS}
+                # stores written before frame skipping have no interpolated frames
+                interpolated = archive["interpolated"] if "interpolated" in archive.files else None
+                return cls(str(archive["kind"]), columns, archive["frame_offsets"], interpolated)
+
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in COLUMNS}
+        frame_offsets = np.load(os.path.join(path, "frame_offsets.npy"))
+        interpolated_path = os.path.join(path, "interpolated.npy")
+        interpolated = np.load(interpolated_path) if os.path.isfile(interpolated_path) else None
+        return cls(str(np.load(os.path.join(path, "kind.npy"))), columns, frame_offsets, interpolated)
+
+
+def frame_offsets_for(frame_ids, num_frames):
+    # row offsets per frame for a sorted frame_id column
+    return np.searchsorted(frame_ids, np.arange(num_frames + 1), side="left").astype(np.int64)
+
+
+def interpolated_frames(frame_ids, num_frames):
+    # per-frame flags from the ids of the interpolated frames
+    interpolated = np.zeros(num_frames, dtype=bool)
+    interpolated[frame_ids] = True
+    return interpolated
+
+
+class RowBuffer:
+    # detections of the frames added since the last take() as per-column Python lists
+    def __init__(self, kind):
+        if kind not in ("ball", "player", "action"):
+            raise ValueError(f"Unknown tracking data: {kind}")
+        self.kind = kind
+        self.rows = {name: [] for name in COLUMNS}
+        self.interpolated = []  # ids of interpolated frames
+
+    def add_row(self, frame_id, track_id=NO_ID, bbox=None, center=None, class_id=NO_ID, conf=None):
+        self.rows["frame_id"].append(frame_id)
+        self.rows["track_id"].append(track_id)
+        self.rows["bbox"].append(bbox if bbox is not None else [np.nan] * 4)
+        self.rows["center"].append(center if center is not None else [np.nan] * 2)
+        self.rows["class"].append(class_id)
+        self.rows["conf"].append(conf if conf is not None else np.nan)
+
+    def add_frame(self, frame_id, info, interpolated=False):
+        # interpolated flags frames without any entry to carry the marker, e.g. player frames without players
+        if interpolated or info.get("interpolated") or \
+                (self.kind == "player" and any(p.get("interpolated") for p in info.values())):
+            self.interpolated.append(frame_id)
+        if self.kind == "ball":
+            if info["center"] is not None:
+                self.add_row(frame_id, bbox=info["bbox"], center=info["center"], conf=info.get("conf"))
+        elif self.kind == "player":
+            for track_id, player in info.items():
+                self.add_row(frame_id, int(track_id), player["bbox"], player["center"],
+                             int(player.get("class", NO_ID)), player.get("conf"))
+        else:
+            # action data saved before confidences were kept has no "conf"
+            confs = info.get("conf") or [None] * len(info["bbox"])
+            for bbox, class_id, conf in zip(info["bbox"], info["class"], confs):
+                center = [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2]
+                self.add_row(frame_id, bbox=bbox, center=center, class_id=int(class_id), conf=conf)
+
+    def take(self):
+        # the buffered rows as numpy columns and the interpolated frame ids, emptying the buffer
+        columns = {name: np.asarray(values, dtype=dtype).reshape((-1,) + shape)
+                   for (name, (dtype, shape)), values in zip(COLUMNS.items(), self.rows.values())}
+        interpolated = np.asarray(self.interpolated, dtype=np.int64)
+        self.rows = {name: [] for name in COLUMNS}
+        self.interpolated = []
+        return columns, interpolated
+
+
+class TrackStoreWriter:
+    # writes a store frame by frame: every chunk of frames is converted to numpy and appended to raw column
+    # files next to the output, which are memory-mapped into the archive at close, so a long video is never
+    # held in memory
+    def __init__(self, kind, path, chunk_frames=DEFAULT_CHUNK_FRAMES):
+        self.kind = kind
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.buffer = RowBuffer(kind)
+        self.num_buffered = 0
+        self.num_frames = 0
+        self.num_rows = 0
+        self.interpolated = []  # per-chunk arrays of interpolated frame ids
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.tmp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(path) or None)
+        self.files = {name: open(os.path.join(self.tmp_dir.name, name), "wb") for name in COLUMNS}
+
+    def write(self, frame_id, info, interpolated=False):
+        self.buffer.add_frame(int(frame_id), info, interpolated)
+        self.num_frames = int(frame_id) + 1
+        self.num_buffered += 1
+        if self.num_buffered >= self.chunk_frames:
+            self.spill()
+
+    def spill(self):
+        columns, interpolated = self.buffer.take()
+        for name, column in columns.items():
+            column.tofile(self.files[name])
+        self.interpolated.append(interpolated)
+        self.num_rows += len(columns["frame_id"])
+        self.num_buffered = 0
+
+    def close(self):
+        """Save the written frames to path, in the TrackStore.save layout."""
+        self.spill()
+        for f in self.files.values():
+            f.close()
+        try:
+            columns = {name: np.memmap(os.path.join(self.tmp_dir.name, name), dtype=dtype, mode="r",
+                                       shape=(self.num_rows,) + shape)
+                       if self.num_rows else np.zeros((0,) + shape, dtype=dtype)
+                       for name, (dtype, shape) in COLUMNS.items()}
+            interpolated = interpolated_frames(np.concatenate(self.interpolated), self.num_frames)
+            TrackStore(self.kind, columns, frame_offsets_for(columns["frame_id"], self.num_frames),
+                       interpolated).save(self.path)
+            del columns
+        finally:
+            self.tmp_dir.cleanup()
+
+
+def save_records_columnar(reader, path, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    # columnar counterpart of save_records_json, read from the records file frame by frame
+    writer = TrackStoreWriter(reader.kind, path, chunk_frames)
+    for frame_id, info, interpolated in reader.records():
+        writer.write(frame_id, info, interpolated)
+    writer.close()
@@ -1,4 +1,8 @@
 import cv2
+import numpy as np
+
+# width of the court mask used for filtering detections
+DEFAULT_MASK_WIDTH = 640
 
 def load_mask(mask_path, frame_width=1920, frame_height=1080):
     mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
@@ -15,4 +19,56 @@ def load_mask(mask_path, frame_width=1920, frame_height=1080):
 
 def foot_pos(bbox):
     x1, y1, x2, y2 = bbox
-    return (x1 + x2) / 2, y2
\ No newline at end of file
+    return (x1 + x2) / 2, y2
+
+
+def foot_points(boxes):
+    # (N, 4) xyxy boxes -> (N, 2) bottom-center points
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+
+
+class CourtMask:
+    # court mask kept at a reduced resolution; points in frame coordinates are tested in one lookup
+    def __init__(self, mask, frame_width=1920, frame_height=1080):
+        self.mask = mask > 0
+        self.scale_x = self.mask.shape[1] / frame_width
+        self.scale_y = self.mask.shape[0] / frame_height
+
+    def contains(self, points):
+        # (N, 2) frame points -> (N,) bool; points outside the frame are clamped to the border
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        mask_h, mask_w = self.mask.shape
+        cols = np.clip(((points[:, 0] - 1) * self.scale_x).astype(np.int64), 0, mask_w - 1)
+        rows = np.clip(((points[:, 1] - 1) * self.scale_y).astype(np.int64), 0, mask_h - 1)
+        return self.mask[rows, cols]
+
+    def keep(self, boxes):
+        # keep detections whose feet are on the court
+        return self.contains(foot_points(boxes))
+
+
+def load_court_mask(mask_path, frame_width=1920, frame_height=1080, mask_width=DEFAULT_MASK_WIDTH):
+    # load the mask straight at mask_width (the model input resolution) instead of the full frame size
+    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise ValueError(f"Cannot load mask image: {mask_path}")
+
+    mask_height = max(1, round(mask_width * frame_height / frame_width))
+    mask = cv2.resize(mask, (mask_width, mask_height), interpolation=cv2.INTER_NEAREST)
+    _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+    return CourtMask(mask, frame_width, frame_height)
+
+def box_iou(boxes_a, boxes_b):
+    # pairwise IoU between two (N, 4) and (M, 4) xyxy box arrays, returns (N, M)
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
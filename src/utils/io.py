@@ -1,17 +1,55 @@
 import json
+import os
 import yaml
+from src.utils.columnar import TrackStore
 
-def save_json_data(data, output_path):
+# supported tracking data formats
+OUTPUT_FORMATS = ("json", "columnar", "both")
+
+
+def save_json_data(data, output_path, indent=None):
     if not data:
         raise ValueError("Empty data")
 
     # Save tracking data to JSON file
     with open(output_path, 'w') as f:
-        json.dump(data, f, indent=4)
+        json.dump(data, f, indent=indent)
     print(f"Tracking data saved to {output_path}")
 
+
+def columnar_path(json_path):
+    # columnar store saved next to the JSON path
+    return os.path.splitext(json_path)[0] + '.npz'
+
+
+def save_tracking_data(data, output_path, output_format="json"):
+    # save tracking data as JSON, as a columnar .npz store, or both
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+    if output_format in ("columnar", "both"):
+        if not data:
+            raise ValueError("Empty data")
+        TrackStore.from_tracking_data(data).save(columnar_path(output_path))
+    if output_format in ("json", "both"):
+        save_json_data(data, output_path)
+
+
+def load_tracking_data(json_path):
+    # load saved tracking data, preferring the columnar store; returns None when nothing was saved
+    if json_path is None:
+        return None
+    store_path = columnar_path(json_path)
+    if os.path.isfile(store_path):
+        return TrackStore.load(store_path)
+    if os.path.isfile(json_path):
+        with open(json_path, 'r') as f:
+            return json.load(f)
+    return None
+
+
 def load_config(config_path):
     if not config_path:
         raise ValueError('Empty config path')
     with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
\ No newline at end of file
+        return yaml.safe_load(f)
@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+
+class Profiler:
+    # per-frame step timings, queue depths and peak memory of a pipeline run; safe to use from several threads
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+        self.timings = defaultdict(lambda: array('d'))  # (component, step) -> per-frame seconds
+        self.queue_depths = defaultdict(list)  # queue name -> sampled depths
+
+    def record(self, component, step, seconds, num_frames=1):
+        # seconds spent on num_frames frames, stored as one per-frame sample each
+        per_frame = seconds / max(num_frames, 1)
+        with self.lock:
+            self.timings[(component, step)].extend([per_frame] * num_frames)
+
+    @contextmanager
+    def stage(self, component, step, num_frames=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(component, step, time.perf_counter() - start, num_frames)
+
+    def record_results(self, component, results, num_frames=None):
+        # model timings measured by ultralytics (ms per image), spread over num_frames when
+        # several images (crops, tiles) belong to one frame
+        totals = defaultdict(float)
+        for result in results:
+            speed = getattr(result, "speed", None) or {}
+            for step, name in (("preprocess", "preprocess"), ("inference", "inference"), ("postprocess", "nms")):
+                if speed.get(step) is not None:
+                    totals[name] += speed[step] / 1000
+        for name, seconds in totals.items():
+            self.record(component, name, seconds, num_frames or len(results))
+
+    def record_queue_depth(self, name, depth):
+        with self.lock:
+            self.queue_depths[name].append(depth)
+
+    def timed_frames(self, frames, component, step="decode"):
+        # time each (frame_id, frame) pulled from a reader; with a threaded reader this is the wait on its queue
+        queue = getattr(frames, "queue", None)
+        iterator = iter(frames)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(component, step, time.perf_counter() - start)
+            if queue is not None:
+                self.record_queue_depth(f"{component}.{step}", queue.qsize())
+            yield item
+
+    def timed(self, handle, component, step):
+        # wrap a per-frame callable, e.g. the writer thread's encode
+        def wrapper(*args, **kwargs):
+            with self.stage(component, step):
+                return handle(*args, **kwargs)
+        return wrapper
+
+    @staticmethod
+    def peak_rss_mb():
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 ** 2) if sys.platform == "darwin" else peak / 1024
+
+    def report(self):
+        wall_time = time.perf_counter() - self.start_time
+        with self.lock:
+            steps = []
+            for (component, step), samples in self.timings.items():
+                samples_ms = np.asarray(samples) * 1000
+                total = float(np.sum(samples))
+                steps.append({
+                    "component": component,
+                    "step": step,
+                    "frames": len(samples),
+                    "total_s": round(total, 4),
+                    "mean_ms": round(float(samples_ms.mean()), 3),
+                    "p50_ms": round(float(np.percentile(samples_ms, 50)), 3),
+                    "p95_ms": round(float(np.percentile(samples_ms, 95)), 3),
+                    "max_ms": round(float(samples_ms.max()), 3),
+                    "fps": round(len(samples) / total, 2) if total > 0 else None
+                })
+            queues = {name: {"mean": round(float(np.mean(depths)), 2), "max": int(np.max(depths))}
+                      for name, depths in self.queue_depths.items()}
+
+        return {"wall_time_s": round(wall_time, 3), "peak_rss_mb": round(self.peak_rss_mb(), 1),
+                "steps": steps, "queues": queues}
+
+    def save(self, output_path):
+        # JSON report, or one CSV row per component step
+        report = self.report()
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if output_path.endswith(".csv"):
+            with open(output_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(report["steps"][0]) if report["steps"] else ["component"])
+                writer.writeheader()
+                writer.writerows(report["steps"])
+        else:
+            with open(output_path, "w") as f:
+                json.dump(report, f, indent=2)
+        print(f"Profile saved to {output_path}")
+        return report
+
+    def summary_table(self, report=None):
+        report = report or self.report()
+        lines = [f"{'component':<10} {'step':<12} {'frames':>8} {'total s':>9} {'mean ms':>9} "
+                 f"{'p95 ms':>9} {'fps':>9}"]
+        for row in report["steps"]:
+            fps = f"{row['fps']:.1f}" if row["fps"] else "-"
+            lines.append(f"{row['component']:<10} {row['step']:<12} {row['frames']:>8} {row['total_s']:>9.2f} "
+                         f"{row['mean_ms']:>9.2f} {row['p95_ms']:>9.2f} {fps:>9}")
+        for name, depth in report["queues"].items():
+            lines.append(f"queue {name}: mean depth {depth['mean']}, max {depth['max']}")
+        lines.append(f"wall time {report['wall_time_s']:.1f} s, peak RSS {report['peak_rss_mb']:.0f} MB")
+        return "\n".join(lines)
+
+
+class NullProfiler:
+    # default profiler: every hook is a no-op so instrumentation costs nothing when disabled
+    @contextmanager
+    def stage(self, component, step, num_frames=1):
+        yield
+
+    def record(self, component, step, seconds, num_frames=1):
+        pass
+
+    def record_results(self, component, results, num_frames=None):
+        pass
+
+    def record_queue_depth(self, name, depth):
+        pass
+
+    def timed_frames(self, frames, component, step="decode"):
+        return frames
+
+    def timed(self, handle, component, step):
+        return handle
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,129 @@
+import json
+import os
+
+# constants for easy configuration
+DEFAULT_FLUSH_INTERVAL = 250  # frames written between flushes to disk and checkpoints
+
+
+def checkpoint_path(records_path):
+    return records_path + ".ckpt"
+
+
+def load_checkpoint(records_path):
+    # last checkpoint of a records file, None when there is none
+    try:
+        with open(checkpoint_path(records_path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class RecordWriter:
+    # append-only JSON lines of [frame_id, info], or [frame_id, info, true] for a frame the stride interpolated,
+    # one line per frame; every flush is followed by a checkpoint
+    # holding the byte offset of the last complete frame, so a crashed run can continue from there
+    def __init__(self, path, checkpoint=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if checkpoint is not None and os.path.isfile(path):
+            # drop whatever was written after the checkpoint
+            self.stream = open(path, "r+")
+            self.stream.truncate(checkpoint["offset"])
+            self.stream.seek(checkpoint["offset"])
+            self.last_frame_id = checkpoint["frame_id"]
+        else:
+            self.stream = open(path, "w")
+            self.last_frame_id = None
+            if os.path.isfile(checkpoint_path(path)):
+                os.remove(checkpoint_path(path))
+        self.num_unflushed = 0
+
+    def write(self, frame_id, info, interpolated=False):
+        self.stream.write(json.dumps([frame_id, info, True] if interpolated else [frame_id, info]) + "\n")
+        self.last_frame_id = frame_id
+        self.num_unflushed += 1
+
+    def should_flush(self):
+        return self.num_unflushed >= self.flush_interval
+
+    def flush(self, state=None, complete=False, **extra):
+        """Make the written frames durable and checkpoint them with the state needed to continue after them."""
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+        checkpoint = {"frame_id": self.last_frame_id, "offset": self.stream.tell(), "state": state,
+                      "complete": complete, **extra}
+
+        # write then rename so a crash never leaves a partial checkpoint
+        tmp_path = f"{checkpoint_path(self.path)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path(self.path))
+        self.num_unflushed = 0
+
+    def close(self, state=None, **extra):
+        # final checkpoint marks the records as complete
+        self.flush(state, complete=True, **extra)
+        self.stream.close()
+
+
+class RecordReader:
+    # lazy view of a records file: iterates frames without loading the file, and serves sequential
+    # per-frame lookups (rendering, aggregation) from a forward-only cursor
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+        self.cursor = None
+        self.current = None  # (frame_id, info) under the cursor, None once the file is exhausted
+        self.position = None  # last frame id looked up
+
+    def __iter__(self):
+        for frame_id, info, _ in self.records():
+            yield frame_id, info
+
+    def records(self):
+        # (frame_id, info, interpolated) of every frame
+        with open(self.path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partial last line of an interrupted write
+                record = json.loads(line)
+                yield record[0], record[1], len(record) > 2 and record[2]
+
+    def interpolated_frames(self):
+        # ids of the frames the stride interpolated
+        for frame_id, _, interpolated in self.records():
+            if interpolated:
+                yield frame_id
+
+    def frame_ids(self):
+        for frame_id, _ in self:
+            yield frame_id
+
+    def frame_entry(self, frame_id):
+        # info of frame_id, None when the frame has no record; restarts from the top when going backwards
+        if self.cursor is None or frame_id < self.position:
+            self.cursor = iter(self)
+            self.current = next(self.cursor, None)
+        self.position = frame_id
+        while self.current is not None and self.current[0] < frame_id:
+            self.current = next(self.cursor, None)
+        if self.current is not None and self.current[0] == frame_id:
+            return self.current[1]
+        return None
+
+
+def save_records_json(reader, output_path):
+    # same layout as json.dump of the stage's tracking data, {kind: {frame_id: info}} plus the interpolated
+    # frames of players, written frame by frame
+    with open(output_path, "w") as f:
+        f.write("{" + json.dumps(reader.kind) + ": {")
+        for i, (frame_id, info) in enumerate(reader):
+            f.write((", " if i else "") + json.dumps(str(frame_id)) + ": " + json.dumps(info))
+        f.write("}")
+        if reader.kind == "player":
+            f.write(', "interpolated_frames": ' + json.dumps(list(reader.interpolated_frames())))
+        f.write("}")
+    print(f"Tracking data saved to {output_path}")
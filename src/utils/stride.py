@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+# constants for easy configuration
+DEFAULT_STRIDE = 1  # run the model on every n-th frame, 1 runs it on every frame
+DEFAULT_MOTION_THRESHOLD = 4.0  # mean absolute gray-level change since the last inferred frame that forces inference
+MOTION_SIZE = (64, 36)  # frame size the motion energy is measured at
+
+
+class FrameStride:
+    # decides which frames go through the model: every `stride`-th frame, or with adaptive stride also any
+    # frame whose difference energy to the last inferred frame exceeds motion_threshold
+    def __init__(self, stride=DEFAULT_STRIDE, adaptive=False, motion_threshold=DEFAULT_MOTION_THRESHOLD):
+        self.stride = max(1, stride)
+        self.adaptive = adaptive
+        self.motion_threshold = motion_threshold
+        self.reset()
+
+    def reset(self):
+        # the next frame is always inferred
+        self.last_frame_id = None
+        self.last_thumbnail = None
+
+    def params(self):
+        return {"stride": self.stride, "adaptive": self.adaptive, "motion_threshold": self.motion_threshold}
+
+    @staticmethod
+    def thumbnail(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, MOTION_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def select(self, frame_ids, frames):
+        # one bool per frame, True where the model has to run
+        if self.stride == 1:
+            return [True] * len(frame_ids)
+
+        selected = []
+        for frame_id, frame in zip(frame_ids, frames):
+            thumbnail = self.thumbnail(frame) if self.adaptive else None
+            infer = self.last_frame_id is None or frame_id - self.last_frame_id >= self.stride
+            if not infer and self.adaptive:
+                infer = bool(np.abs(thumbnail - self.last_thumbnail).mean() >= self.motion_threshold)
+            if infer:
+                self.last_frame_id, self.last_thumbnail = frame_id, thumbnail
+            selected.append(infer)
+        return selected
+
+
+def interpolate_players(prev_players, next_players, weight):
+    # players between two inferred frames, weight in (0, 1) from prev to next; ids seen in both frames move
+    # linearly, ids seen in only one are held on that frame's side of the midpoint
+    players = {}
+    for track_id in sorted(prev_players.keys() | next_players.keys(), key=int):
+        prev, next_ = prev_players.get(track_id), next_players.get(track_id)
+        if prev is not None and next_ is not None:
+            bbox = (np.asarray(prev["bbox"]) * (1 - weight) + np.asarray(next_["bbox"]) * weight).tolist()
+        elif (prev if weight < 0.5 else next_) is not None:
+            bbox = list((prev if weight < 0.5 else next_)["bbox"])
+        else:
+            continue
+        players[track_id] = {"bbox": bbox, "center": [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2],
+                             "interpolated": True}
+        # interpolated boxes keep the detected class but have no confidence of their own
+        class_id = (prev if prev is not None else next_).get("class")
+        if class_id is not None:
+            players[track_id]["class"] = class_id
+    return players
@@ -0,0 +1,242 @@
+import cv2
+import shutil
+import subprocess
+import threading
+from queue import Queue, Empty, Full
+
+# default depth of the bounded queues between decode, inference and encode
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_FFMPEG_CODEC = "libx264"
+
+# marks the end of a queue
+_END = object()
+
+
+def get_video_info(video_path):
+    # read basic properties of a video without decoding frames
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+
+    info = {
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "num_frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    }
+    cap.release()
+    return info
+
+
+class FrameReader:
+    # decode a video once and yield (frame_id, frame) pairs,
+    # optionally restricted to the frame range [start_frame, end_frame)
+    def __init__(self, video_path, start_frame=0, end_frame=None):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video: {video_path}")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.num_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # the frame count from the container is only an estimate, so without end_frame read until EOF
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        last_frame = self.num_frames if end_frame is None else min(end_frame, self.num_frames)
+        self.num_frames = max(0, last_frame - start_frame)
+
+        # seek to the nearest keyframe and decode forward to start_frame
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    def __iter__(self):
+        frame_id = self.start_frame
+        while self.cap.isOpened() and (self.end_frame is None or frame_id < self.end_frame):
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            yield frame_id, frame
+            frame_id += 1
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ThreadedFrameReader(FrameReader):
+    # decode on a background thread into a bounded queue so decoding overlaps with inference
+    def __init__(self, video_path, queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(video_path)
+        self.queue = Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        # block while the queue is full, but give up once the consumer has stopped
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _decode(self):
+        try:
+            for item in FrameReader.__iter__(self):
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            yield item
+
+        # surface decoder errors in the consuming thread
+        if self.error is not None:
+            raise self.error
+
+    def release(self):
+        # stop the decoder, drop queued frames and wait for the thread before closing the capture
+        self.stop_event.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                break
+        self.thread.join()
+        self.cap.release()
+
+
+def open_frame_reader(video_path, queue_size=0):
+    # a queue size of 0 decodes inline on the calling thread
+    if queue_size > 0:
+        return ThreadedFrameReader(video_path, queue_size)
+    return FrameReader(video_path)
+
+
+class OrderedWriter:
+    # run handle(item) for every submitted item in submission order,
+    # on a background thread behind a bounded queue when queue_size > 0
+    def __init__(self, handle, queue_size=0):
+        self.handle = handle
+        self.error = None
+        self.queue = None
+        if queue_size > 0:
+            self.queue = Queue(maxsize=queue_size)
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            if self.error is not None:
+                continue  # keep draining so producers never block after a failure
+            try:
+                self.handle(item)
+            except Exception as e:
+                self.error = e
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def put(self, item):
+        if self.queue is None:
+            self.handle(item)
+            return
+        self._raise_error()
+        self.queue.put(item)
+
+    def depth(self):
+        # items waiting for the writer thread
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def close(self):
+        # flush pending items and re-raise any error from the writer thread
+        if self.queue is not None:
+            self.queue.put(_END)
+            self.thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self.queue is not None:
+            # error in the producer: stop the writer without masking the original exception
+            self.queue.put(_END)
+            self.thread.join()
+
+
+class FFmpegWriter:
+    # pipe raw BGR frames into an ffmpeg process; same write/release interface as cv2.VideoWriter
+    def __init__(self, output_path, fps, frame_width, frame_height, codec=DEFAULT_FFMPEG_CODEC, preset="veryfast"):
+        self.frame_size = (frame_height, frame_width)
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{frame_width}x{frame_height}", "-r", str(fps),
+            "-i", "-",
+            "-c:v", codec, "-preset", preset, "-pix_fmt", "yuv420p",
+            output_path
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.tobytes())
+
+    def release(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}")
+
+
+def create_video_writer(output_path, fps, frame_width, frame_height, encoder="mp4v", codec=DEFAULT_FFMPEG_CODEC):
+    # "mp4v" uses OpenCV's VideoWriter, "ffmpeg" pipes frames to the ffmpeg binary with the given codec
+    if encoder == "ffmpeg":
+        if shutil.which("ffmpeg") is None:
+            raise ValueError("ffmpeg encoder selected but the ffmpeg binary was not found")
+        return FFmpegWriter(output_path, fps, frame_width, frame_height, codec)
+    if encoder != "mp4v":
+        raise ValueError(f"Unknown video encoder: {encoder}")
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(output_path, fourcc, int(fps), (frame_width, frame_height))
+
+
+def batched(frames, batch_size, segment_size=None):
+    # group (frame_id, frame) pairs into lists of at most batch_size frames;
+    # with segment_size, a batch never crosses a multiple of segment_size
+    frame_ids, batch = [], []
+    for frame_id, frame in frames:
+        if batch and segment_size and frame_id % segment_size == 0:
+            yield frame_ids, batch
+            frame_ids, batch = [], []
+
+        frame_ids.append(frame_id)
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield frame_ids, batch
+            frame_ids, batch = [], []
+
+    if batch:
+        yield frame_ids, batch